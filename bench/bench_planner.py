@@ -0,0 +1,95 @@
+"""
+Time the stages of the planner over families of synthetic query graphs.
+
+    python -m bench.bench_planner [--quick] [--repeat N] [--output bench_results.json]
+
+For each case, records the best time out of --repeat runs of convert (convert_to_graph), decompose, dehair (summed
+over components), generate_simple_plan (summed over components) and the whole of generate_plan, along with the peak
+memory allocated during generate_plan and the depth and width of the deepest plan, as JSON.  The same stages on the
+networkx backend (convert_to_networkx, and generate_plan with backend='networkx') are under networkx_seconds.
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+
+from src.query_graph import convert_to_graph, convert_to_networkx
+from src.generate_plan import generate_plan, decompose, dehair, generate_simple_plan
+from bench.query_graphs import FAMILIES, DEFAULT_CASES, QUICK_CASES
+
+STAGES = ['convert', 'decompose', 'dehair', 'generate_simple_plan', 'generate_plan']
+
+def time_stages(trapi, backend=None):
+    """One run through the planner, returning the time spent in each stage.  backend is as for generate_plan"""
+    times = {}
+    start = time.perf_counter()
+    graph = convert_to_networkx(trapi) if backend == 'networkx' else convert_to_graph(trapi)
+    times['convert'] = time.perf_counter() - start
+    start = time.perf_counter()
+    double_pins, components = decompose(graph)
+    times['decompose'] = time.perf_counter() - start
+    times['dehair'] = times['generate_simple_plan'] = 0
+    for component in components:
+        start = time.perf_counter()
+        hairs, bald_head = dehair(component)
+        times['dehair'] += time.perf_counter() - start
+        start = time.perf_counter()
+        generate_simple_plan(bald_head)
+        times['generate_simple_plan'] += time.perf_counter() - start
+    start = time.perf_counter()
+    generate_plan(trapi, backend=backend)
+    times['generate_plan'] = time.perf_counter() - start
+    return times
+
+def peak_memory(trapi):
+    tracemalloc.start()
+    try:
+        generate_plan(trapi)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_case(family, size, bound, repeat=5):
+    trapi = FAMILIES[family](size) if bound is None else FAMILIES[family](size, bound)
+    runs = [ time_stages(trapi) for _ in range(repeat) ]
+    networkx_runs = [ time_stages(trapi, backend='networkx') for _ in range(repeat) ]
+    plans = generate_plan(trapi)
+    deepest = max(plans, key=lambda plan: plan.depth())
+    return {
+        'family': family,
+        'size': size,
+        'bound': sum(1 for node in trapi['nodes'].values() if 'ids' in node),
+        'nodes': len(trapi['nodes']),
+        'edges': len(trapi['edges']),
+        'plans': len(plans),
+        'depth': deepest.depth(),
+        'width': deepest.width(),
+        'seconds': { stage: min(run[stage] for run in runs) for stage in STAGES },
+        'networkx_seconds': { stage: min(run[stage] for run in networkx_runs) for stage in STAGES },
+        'peak_memory_bytes': peak_memory(trapi),
+    }
+
+def run(cases, repeat=5):
+    return {
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'results': [ run_case(family, size, bound, repeat) for family, size, bound in cases ],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='run a handful of small cases')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case; the best time is kept')
+    parser.add_argument('--output', default='bench_results.json', help='where to write the results')
+    args = parser.parse_args(argv)
+    results = run(QUICK_CASES if args.quick else DEFAULT_CASES, args.repeat)
+    with open(args.output, 'w') as outf:
+        json.dump(results, outf, indent=2)
+    for result in results['results']:
+        print(f"{result['family']:>12} {result['size']:>4} bound={result['bound']:<3} edges={result['edges']:<5}"
+              f" plan={result['seconds']['generate_plan']*1000:9.3f}ms  peak={result['peak_memory_bytes']/1024:9.1f}KiB"
+              f"  depth={result['depth']:<3} width={result['width']}")
+
+if __name__ == '__main__':
+    main()
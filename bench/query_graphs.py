@@ -0,0 +1,112 @@
+"""
+Synthetic TRAPI query graphs for benchmarking the planner.  Each family is a function that takes a size
+(and sometimes the number of bound nodes) and returns a TRAPI query graph.
+"""
+
+def construct_trapi(nodes, edges):
+    """nodes maps node ids to whether they are bound, edges maps edge ids to (subject, object)"""
+    trapi = {"nodes": {}, "edges": {}}
+    for node_id, bound in nodes.items():
+        trapi['nodes'][node_id] = {"ids": [f'CURIE:{node_id}']} if bound else {"categories": ['biolink:NamedThing']}
+    for edge_id, (subject, object) in edges.items():
+        trapi['edges'][edge_id] = {'subject': subject, 'object': object, 'predicates': ['biolink:related_to']}
+    return trapi
+
+def spread(n, bound):
+    """Indices of bound nodes spread evenly over n nodes, always including the first"""
+    bound = max(1, min(bound, n))
+    return set( (i * n) // bound for i in range(bound) )
+
+def chain(n, bound=1):
+    """An n-hop.  With bound=2, both ends are bound."""
+    ends = {0, n} if bound >= 2 else {0}
+    nodes = { f'n{i}': i in ends for i in range(n+1) }
+    edges = { f'e{i}': (f'n{i}', f'n{i+1}') for i in range(n) }
+    return construct_trapi(nodes, edges)
+
+def star(n, bound=1):
+    """n one-hops off of a bound hub.  Extra bound nodes are leaves."""
+    nodes = { 'hub': True }
+    nodes.update( { f'n{i}': i < bound - 1 for i in range(n) } )
+    edges = { f'e{i}': ('hub', f'n{i}') for i in range(n) }
+    return construct_trapi(nodes, edges)
+
+def hairy_tree(n, bound=1):
+    """A binary tree of n edges hanging off of a bound root.  Extra bound nodes are leaves, so that some of the
+    tree is bald core and the rest is hair."""
+    nodes = { f'n{i}': i == 1 for i in range(1, n+2) }
+    leaves = [ i for i in range(n+1, 0, -1) if 2*i > n+1 ]
+    for i in leaves[:bound-1]:
+        nodes[f'n{i}'] = True
+    edges = { f'e{i}': (f'n{i//2}', f'n{i}') for i in range(2, n+2) }
+    return construct_trapi(nodes, edges)
+
+def cycle(n, bound=1):
+    bound_nodes = spread(n, bound)
+    nodes = { f'n{i}': i in bound_nodes for i in range(n) }
+    edges = { f'e{i}': (f'n{i}', f'n{(i+1)%n}') for i in range(n) }
+    return construct_trapi(nodes, edges)
+
+def grid(n, bound=1):
+    """An n by n grid"""
+    bound_nodes = spread(n*n, bound)
+    nodes = { f'n{i}_{j}': i*n + j in bound_nodes for i in range(n) for j in range(n) }
+    edges = {}
+    for i in range(n):
+        for j in range(n):
+            if i + 1 < n:
+                edges[f'v{i}_{j}'] = (f'n{i}_{j}', f'n{i+1}_{j}')
+            if j + 1 < n:
+                edges[f'h{i}_{j}'] = (f'n{i}_{j}', f'n{i}_{j+1}')
+    return construct_trapi(nodes, edges)
+
+def clique(n, bound=1):
+    bound_nodes = spread(n, bound)
+    nodes = { f'n{i}': i in bound_nodes for i in range(n) }
+    edges = { f'e{i}_{j}': (f'n{i}', f'n{j}') for i in range(n) for j in range(i+1, n) }
+    return construct_trapi(nodes, edges)
+
+README_NODES = {'A': True, 'B': True, 'C': False, 'D': False, 'E': False, 'F': False, 'G': False, 'H': False, 'I': True}
+README_EDGES = {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'AC': ('A', 'C'), 'CD': ('C', 'D'), 'DE': ('D', 'E'),
+                'DF': ('D', 'F'), 'EF': ('E', 'F'), 'FG': ('F', 'G'), 'GH': ('G', 'H'), 'GI': ('G', 'I')}
+
+def readme(n, bound=None):
+    """n copies of the query in the README, each sharing its A with the I of the one before"""
+    nodes = {}
+    edges = {}
+    for copy in range(n):
+        def name(node):
+            if node == 'A' and copy > 0:
+                return f'I{copy-1}'
+            return f'{node}{copy}'
+        for node, is_bound in README_NODES.items():
+            nodes[name(node)] = is_bound
+        for edge, (subject, object) in README_EDGES.items():
+            edges[f'{edge}{copy}'] = (name(subject), name(object))
+    return construct_trapi(nodes, edges)
+
+FAMILIES = {
+    'chain': chain,
+    'star': star,
+    'hairy_tree': hairy_tree,
+    'cycle': cycle,
+    'grid': grid,
+    'clique': clique,
+    'readme': readme,
+}
+
+#(family, size, bound nodes) for a default run
+DEFAULT_CASES = [
+    ('chain', 2, 1), ('chain', 10, 1), ('chain', 10, 2), ('chain', 100, 2),
+    ('star', 10, 1), ('star', 200, 1), ('star', 200, 3),
+    ('hairy_tree', 50, 1), ('hairy_tree', 500, 1), ('hairy_tree', 500, 4),
+    ('cycle', 6, 1), ('cycle', 30, 1), ('cycle', 30, 3),
+    ('grid', 3, 1), ('grid', 4, 2), ('grid', 5, 4),
+    ('clique', 5, 1), ('clique', 7, 2), ('clique', 9, 3),
+    ('readme', 1, None), ('readme', 5, None), ('readme', 20, None),
+]
+
+QUICK_CASES = [
+    ('chain', 3, 2), ('star', 5, 1), ('hairy_tree', 10, 2), ('cycle', 5, 1), ('grid', 3, 2), ('clique', 4, 2),
+    ('readme', 2, None),
+]
@@ -1,15 +1,35 @@
-from collections import defaultdict
+import json
+import struct
+import sys
+from array import array
+from collections import defaultdict, deque
+from itertools import islice
+
+from .query_graph import get_edge_ids
 
 class QueryPlan:
     def __init__(self):
         self.nexts = defaultdict(list)
         self.prevs = defaultdict(list)
+        #edge id -> (input node, output node), the way the plan walks the edge
+        self.directions = {}
     def add_dependency(self, graph, fromnode, tonode, last, traversed_subgraph):
-        edge_id = graph.get_edge_data(fromnode, tonode)['edge_id']
-        self.nexts[last].append(edge_id)
-        self.prevs[edge_id].append(last)
-        traversed_subgraph['edges'].add(edge_id)
-        return edge_id
+        edge_ids = get_edge_ids(graph.get_edge_data(fromnode, tonode))
+        traversed_subgraph['edges'].update(edge_ids)
+        return self.add_edges(last, fromnode, tonode, edge_ids)
+    def add_edges(self, last, fromnode, tonode, edge_ids):
+        """Add the query edges between two nodes after last.  If there are parallel edges, they all run at once and
+        are joined before moving on, so that every one of them constrains tonode.  Returns the event that comes
+        after them: the edge, or the join."""
+        for edge_id in edge_ids:
+            self.add_simple_dependency(last, edge_id)
+            self.directions[edge_id] = (fromnode, tonode)
+        if len(edge_ids) == 1:
+            return edge_ids[0]
+        join = JoinEvent(None, [fromnode, tonode], edge_ids)
+        for edge_id in edge_ids:
+            self.add_simple_dependency(edge_id, join)
+        return join
     def add_simple_dependency(self, upstream, joinnode):
         self.nexts[upstream].append(joinnode)
         self.prevs[joinnode].append(upstream)
@@ -33,11 +53,202 @@ class QueryPlan:
             return self.prevs[x]
         else:
             return (frozenset(),frozenset())
+    def get_input(self, edge_id):
+        """
+        Where the edge gets its input from: (input node, source), where source is the event that has the final say
+        on which ids the input node can take.  That is the nearest event upstream of the edge that produced the node:
+        a join that covers it, which will have pruned the ids that didn't fit, or the edge that walked to it.
+        If nothing upstream produced it, the node is bound, and the source is the start of the plan (the empty join).
+        Returns None if the plan doesn't know which way the edge goes (plans saved before format version 3).
+        """
+        if edge_id not in self.directions:
+            return None
+        node = self.directions[edge_id][0]
+        return node, input_source(self.prevs, self.directions, node, edge_id)
+    def inputs(self):
+        """edge id -> get_input(edge id), for every edge in the plan"""
+        return { edge_id: self.get_input(edge_id) for edge_id in self.directions }
+    def depth(self, cost=None):
+        """
+        How long the plan takes from start to end, if every edge starts as soon as everything upstream of it has
+        finished and takes cost(edge_id) (by default 1, so this counts the edges on the critical path), and joins
+        take no time
+        """
+        finish = schedule(self, cost)
+        return max( time for time, prev in finish.values() )
+    def critical_path(self, cost=None):
+        """The edges and joins along a longest chain of dependencies (see depth), in order"""
+        finish = schedule(self, cost)
+        x = max(finish, key=lambda x: finish[x][0])
+        path = []
+        while x is not None:
+            if event_kind(x) != TERMINAL and x != (frozenset(), frozenset()):
+                path.append(x)
+            x = finish[x][1]
+        return path[::-1]
+    def width(self, cost=None):
+        """The most edges running at once, when the plan is run as in depth"""
+        finish = schedule(self, cost)
+        changes = []
+        for x, (time, prev) in finish.items():
+            if event_kind(x) == EDGE:
+                changes.append( (time - (1 if cost is None else cost(x)), 1) )
+                changes.append( (time, -1) )
+        #Edges that end at the same moment as others start don't overlap them
+        changes.sort()
+        running = most = 0
+        for time, change in changes:
+            running += change
+            most = max(most, running)
+        return most
+    def relabel(self, node_map=None, edge_map=None):
+        """Return a copy of this plan with the query graph nodes and edges renamed according to the given dicts.
+        Anything missing from a map keeps its name."""
+        node_map = node_map or {}
+        edge_map = edge_map or {}
+        events = {}
+        def convert(x):
+            if x not in events:
+                events[x] = relabel_event(x, node_map, edge_map, events)
+            return events[x]
+        plan = QueryPlan()
+        for x, nexts in self.nexts.items():
+            plan.nexts[convert(x)] = [convert(n) for n in nexts]
+        for x, prevs in self.prevs.items():
+            plan.prevs[convert(x)] = [convert(p) for p in prevs]
+        for edge_id, (u, v) in self.directions.items():
+            plan.directions[edge_map.get(edge_id, edge_id)] = (node_map.get(u, u), node_map.get(v, v))
+        return plan
+    def compile(self):
+        """Freeze this plan into a CompiledPlan, for executing it"""
+        return CompiledPlan.from_plan(self)
+    def to_dict(self):
+        """
+        A JSON-able form of this plan.  Every node, edge id and terminal name goes in a string table, and events
+        are numbered in order of appearance, starting with the empty join.  An edge is the index of its id, a join
+        is a pair of lists of node and edge indexes, plus the number of its parent join if it has one (in which case
+        the nodes and edges are only the new ones, see JoinEvent), and a terminal event is
+        {"terminal": index of its name}.  nexts and prevs are lists of [event, [events]], in the same order as in
+        the plan, and directions is a list of [edge id, input node, output node] indexes.
+        """
+        strings, events, nexts, prevs, directions = encode_plan(self)
+        def event_json(x):
+            kind, value = x
+            if kind == EDGE:
+                return value
+            if kind == JOIN:
+                parent, nodes, edges = value
+                return [nodes, edges] if parent is None else [nodes, edges, parent]
+            return {'terminal': value}
+        return { 'version': FORMAT_VERSION, 'strings': strings, 'events': [ event_json(x) for x in events ],
+                 'nexts': [ [i, js] for i, js in nexts ], 'prevs': [ [i, js] for i, js in prevs ],
+                 'directions': [ list(x) for x in directions ] }
+    @classmethod
+    def from_dict(cls, data):
+        check_version(data['version'])
+        def event_value(x):
+            if isinstance(x, int):
+                return (EDGE, x)
+            if isinstance(x, dict):
+                return (TERMINAL, x['terminal'])
+            return (JOIN, (x[2] if len(x) > 2 else None, x[0], x[1]))
+        return decode_plan(data['strings'], [ event_value(x) for x in data['events'] ], data['nexts'], data['prevs'],
+                           data.get('directions', ()))
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+    def to_bytes(self):
+        """
+        A compact binary form of this plan: the magic bytes, then the version, the number of strings, the number of
+        ints as little-endian uint32s, and the size of the ints (1, 2 or 4 bytes, whichever is big enough).  Then the
+        lengths of the utf8 strings, the strings, and the plan as ints.  Those are the events (kind, then the edge
+        id, the name of a terminal, or for a join, one more than its parent's number or 0, and the node and edge
+        counts and indexes), then the count of nexts and each event, its count and its nexts, and the same for
+        prevs.  Last come the count of directions and each edge id, input node and output node.
+        """
+        strings, events, nexts, prevs, directions = encode_plan(self)
+        ints = array('I', [len(events)])
+        for kind, value in events:
+            ints.append(kind)
+            if kind == JOIN:
+                parent, nodes, edges = value
+                ints.append(0 if parent is None else parent + 1)
+                for part in (nodes, edges):
+                    ints.append(len(part))
+                    ints.extend(part)
+            else:
+                ints.append(value)
+        for adjacency in (nexts, prevs):
+            ints.append(len(adjacency))
+            for i, js in adjacency:
+                ints.append(i)
+                ints.append(len(js))
+                ints.extend(js)
+        ints.append(len(directions))
+        for x in directions:
+            ints.extend(x)
+        encoded = [ string.encode('utf8') for string in strings ]
+        lengths = array('I', map(len, encoded))
+        typecode = int_typecode(max(max(ints), max(lengths, default=0)))
+        ints, lengths = array(typecode, ints), array(typecode, lengths)
+        if sys.byteorder == 'big':
+            ints.byteswap()
+            lengths.byteswap()
+        header = MAGIC + struct.pack(HEADER, FORMAT_VERSION, len(strings), len(ints), ints.itemsize)
+        return b''.join([header, lengths.tobytes(), *encoded, ints.tobytes()])
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a serialized QueryPlan')
+        offset = len(MAGIC)
+        if len(data) < offset + struct.calcsize(HEADER):
+            raise ValueError('Truncated QueryPlan')
+        version, string_count, int_count, itemsize = struct.unpack_from(HEADER, data, offset)
+        check_version(version)
+        typecode = int_typecode(256 ** itemsize - 1)
+        offset += struct.calcsize(HEADER)
+        if len(data) < offset + itemsize*(string_count + int_count):
+            raise ValueError('Truncated QueryPlan')
+        lengths = array(typecode)
+        lengths.frombytes(data[offset:offset + itemsize*string_count])
+        if sys.byteorder == 'big':
+            lengths.byteswap()
+        offset += itemsize*string_count
+        if len(data) < offset + sum(lengths) + itemsize*int_count:
+            raise ValueError('Truncated QueryPlan')
+        strings = []
+        for length in lengths:
+            strings.append(data[offset:offset + length].decode('utf8'))
+            offset += length
+        ints = array(typecode)
+        ints.frombytes(data[offset:offset + itemsize*int_count])
+        if sys.byteorder == 'big':
+            ints.byteswap()
+        ints = iter(ints.tolist())
+        def take(n):
+            return list(islice(ints, n))
+        events = []
+        for _ in range(next(ints)):
+            kind = next(ints)
+            if kind == JOIN:
+                parent = next(ints) - 1 if version > 1 else -1
+                nodes = take(next(ints))
+                events.append( (kind, (None if parent < 0 else parent, nodes, take(next(ints)))) )
+            else:
+                events.append( (kind, next(ints)) )
+        adjacencies = []
+        for _ in range(2):
+            adjacencies.append([ (next(ints), take(next(ints))) for _ in range(next(ints)) ])
+        directions = [ take(3) for _ in range(next(ints)) ] if version > 2 else ()
+        return decode_plan(strings, events, *adjacencies, directions)
     def add_component_plan(self,x):
         pass
     def add_hairs(self,hair_graph):
         if len(hair_graph.nexts) == 0:
             return
+        self.directions.update(hair_graph.directions)
         if len(self.nexts) == 0:
             self.nexts = hair_graph.nexts
             self.prevs = hair_graph.prevs
@@ -49,9 +260,352 @@ class QueryPlan:
         self.prevs.update(hair_graph.prevs)
         for end in ends:
             self.nexts[end].extend(hair_starts)
+        #The hairs no longer hang off of the start of the plan, but off of its ends
         for start in hair_starts:
-            self.prevs[start].extend(ends)
+            self.prevs[start] = list(ends)
+
+#Serialized plans
+MAGIC = b'QPLN'
+#Version 1 didn't have parent joins, and version 2 didn't have edge directions.  Both can still be read
+FORMAT_VERSION = 3
+#version, number of strings, number of ints, bytes per int
+HEADER = '<IIIB'
+
+def int_typecode(biggest):
+    for typecode in 'BHI':
+        if biggest < 256 ** array(typecode).itemsize:
+            return typecode
+    raise ValueError('Plan is too big to serialize')
+
+def check_version(version):
+    if version not in (1, 2, FORMAT_VERSION):
+        raise ValueError(f'Unsupported QueryPlan format version {version}')
+
+def encode_plan(plan):
+    """Intern a plan's names and events.  Returns the strings, the events as (kind, value) where the value is
+    a string index, or for a join, (parent event index or None, node indexes, edge indexes), the nexts and prevs
+    as lists of (event index, event indexes), and the directions as (edge, input node, output node) string indexes"""
+    strings = {}
+    def string(name):
+        return strings.setdefault(name, len(strings))
+    root = (frozenset(), frozenset())
+    index = {root: 0}
+    events = [ (JOIN, (None, [], [])) ]
+    def intern(x):
+        if x not in index:
+            kind = event_kind(x)
+            if kind == JOIN:
+                parent = None
+                nodes, edges = x
+                if isinstance(x, JoinEvent):
+                    nodes, edges = x.new_nodes, x.new_edges
+                    if x.parent is not None:
+                        parent = intern(x.parent)
+                #Sorted, so that the same plan always comes out the same
+                value = (parent, [ string(n) for n in sorted(nodes) ], [ string(e) for e in sorted(edges) ])
+            elif kind == TERMINAL:
+                value = string(x.name)
+            else:
+                value = string(x)
+            index[x] = len(events)
+            events.append( (kind, value) )
+        return index[x]
+    nexts = [ (intern(x), [ intern(n) for n in ns ]) for x, ns in plan.nexts.items() ]
+    prevs = [ (intern(x), [ intern(p) for p in ps ]) for x, ps in plan.prevs.items() ]
+    directions = [ (string(edge_id), string(u), string(v)) for edge_id, (u, v) in plan.directions.items() ]
+    return list(strings), events, nexts, prevs, directions
+
+def decode_plan(strings, events, nexts, prevs, directions=()):
+    decoded = [ (frozenset(), frozenset()) ]
+    for kind, value in events[1:]:
+        if kind == JOIN:
+            parent, nodes, edges = value
+            parent = None if parent is None else decoded[parent]
+            decoded.append(JoinEvent(parent, [ strings[n] for n in nodes ], [ strings[e] for e in edges ]))
+        elif kind == TERMINAL:
+            decoded.append(TerminalEvent(strings[value]))
+        else:
+            decoded.append(strings[value])
+    events = decoded
+    plan = QueryPlan()
+    for i, js in nexts:
+        plan.nexts[events[i]] = [ events[j] for j in js ]
+    for i, js in prevs:
+        plan.prevs[events[i]] = [ events[j] for j in js ]
+    for edge_id, u, v in directions:
+        plan.directions[strings[edge_id]] = (strings[u], strings[v])
+    return plan
+
+def input_source(prevs, directions, node, edge_id):
+    """The nearest event upstream of edge_id that produced node, breadth first, or the empty join if there isn't one"""
+    root = (frozenset(), frozenset())
+    seen = set()
+    frontier = deque(prevs.get(edge_id, ()))
+    while frontier:
+        x = frontier.popleft()
+        if x in seen:
+            continue
+        seen.add(x)
+        kind = event_kind(x)
+        if kind == JOIN and node in x[0]:
+            return x
+        if kind == EDGE and x in directions and directions[x][1] == node:
+            return x
+        frontier.extend(prevs.get(x, ()))
+    return root
+
+def schedule(plan, cost=None):
+    """event -> (the time it finishes, the prev that finished last), when every edge starts as soon as everything
+    upstream of it is done and takes cost(edge_id), or 1, and nothing else takes any time"""
+    root = (frozenset(), frozenset())
+    waiting = { x: len(prevs) for x, prevs in plan.prevs.items() }
+    finish = { root: (0, None) }
+    ready = deque([root])
+    while ready:
+        x = ready.popleft()
+        for n in plan.nexts.get(x, ()):
+            waiting[n] -= 1
+            if waiting[n] == 0:
+                prev = max(plan.prevs[n], key=lambda p: finish[p][0])
+                duration = (1 if cost is None else cost(n)) if event_kind(n) == EDGE else 0
+                finish[n] = (finish[prev][0] + duration, prev)
+                ready.append(n)
+    return finish
+
+def relabel_event(x, node_map, edge_map, memo):
+    """memo maps events that have already been relabelled to their new versions, so that joins can share their
+    parents"""
+    if x in memo:
+        return memo[x]
+    if isinstance(x, JoinEvent):
+        parent = None if x.parent is None else relabel_event(x.parent, node_map, edge_map, memo)
+        new = JoinEvent(parent, (node_map.get(n,n) for n in x.new_nodes), (edge_map.get(e,e) for e in x.new_edges))
+    elif isinstance(x, tuple):
+        new = (frozenset(node_map.get(n,n) for n in x[0]), frozenset(edge_map.get(e,e) for e in x[1]))
+    elif isinstance(x, str):
+        new = edge_map.get(x,x)
+    else:
+        new = x
+    memo[x] = new
+    return new
+
+class JoinEvent:
+    """
+    A join: the point in a plan where the branches that lead into it come together.  It stands for the subgraph of
+    the query graph that they have covered between them, which need not be everything that has run so far: parts of
+    the plan that don't depend on each other each have their own joins until something joins them.  parent is the
+    join that this one builds on (for a join of several of those, the last of them), or None.
+
+    Joins used to be (frozenset(nodes), frozenset(edges)) tuples, which hold the whole subgraph, so a plan with a
+    join per path holds O(paths x edges).  A JoinEvent only holds the nodes and edges that are new since its parent
+    join, and works out the rest from the chain of parents the first time nodes or edges are asked for, keeping
+    them from then on.  It is still equal to the tuple, hashes the same (worked out once, up front), and can be
+    indexed and unpacked like it.
+    depth is its position along the chain of parents (0 for a join with no parent), which is the same in a
+    relabelled or reloaded plan.  It isn't an id: joins made independently of each other can have the same depth.
+    A join is made before it is part of any plan, so it doesn't have an id of its own; its number in the plan's
+    CompiledPlan (event_id) is small, unique within the plan, and also the same in a relabelled or reloaded plan.
+    """
+    __slots__ = ('parent', 'new_nodes', 'new_edges', 'depth', '_hash', '_nodes', '_edges')
+    def __init__(self, parent, new_nodes, new_edges, nodes=None, edges=None):
+        """If all of the nodes and edges are at hand, passing them in saves working them out for the hash"""
+        self.parent = parent
+        self.new_nodes = frozenset(new_nodes)
+        self.new_edges = frozenset(new_edges)
+        self.depth = 0 if parent is None else parent.depth + 1
+        self._nodes = self._edges = None
+        if nodes is None:
+            nodes, edges = self.nodes, self.edges
+        self._hash = hash( (frozenset(nodes), frozenset(edges)) )
+    def chain(self):
+        join = self
+        while join is not None:
+            yield join
+            join = join.parent
+    @property
+    def nodes(self):
+        if self.parent is None:
+            return self.new_nodes
+        if self._nodes is None:
+            self._nodes = frozenset().union(*(join.new_nodes for join in self.chain()))
+        return self._nodes
+    @property
+    def edges(self):
+        if self.parent is None:
+            return self.new_edges
+        if self._edges is None:
+            self._edges = frozenset().union(*(join.new_edges for join in self.chain()))
+        return self._edges
+    def __hash__(self):
+        return self._hash
+    def __eq__(self, other):
+        if other is self:
+            return True
+        if isinstance(other, JoinEvent):
+            return self._hash == other._hash and self.nodes == other.nodes and self.edges == other.edges
+        if isinstance(other, tuple):
+            return len(other) == 2 and self.nodes == other[0] and self.edges == other[1]
+        return NotImplemented
+    def __len__(self):
+        return 2
+    def __iter__(self):
+        yield self.nodes
+        yield self.edges
+    def __getitem__(self, i):
+        return (self.nodes, self.edges)[i]
+    def __reduce__(self):
+        #Hashes of strings differ from one process to the next, so the hash has to be worked out again
+        return (JoinEvent, (self.parent, self.new_nodes, self.new_edges))
+    def __repr__(self):
+        return f'JoinEvent({self.depth}, {set(self.nodes)!r}, {set(self.edges)!r})'
 
 class TerminalEvent:
     def __init__(self,name):
-        self.name = name
\ No newline at end of file
+        self.name = name
+
+#What a CompiledPlan returns from get_next for events it has never heard of
+NO_NEXT = TerminalEvent('no next')
+
+#Kinds of events in a CompiledPlan
+EDGE = 0
+JOIN = 1
+TERMINAL = 2
+
+class CompiledPlan:
+    """
+    A frozen, compact version of a QueryPlan.
+
+    Every event is interned to a small int (the start of the plan, the empty join, is always 0), and the
+    dependencies are stored as CSR arrays: the nexts of event i are next_targets[next_offsets[i]:next_offsets[i+1]],
+    and likewise for prevs.  The kind of each event, its in-degree, and the start and end events are worked out
+    up front.
+
+    An edge whose only upstream event is another edge doesn't need to wait for that edge to finish; it can
+    consume its results as they arrive.  streams_from[i] is that upstream edge, or -1 if i has to wait.  These are
+    the hairs and the walks along a path towards its join.
+
+    input_nodes[i] is the input node of edge i, and input_sources[i] the event that has the final say on its ids (see
+    QueryPlan.get_input), or None and -1 if that isn't known or i isn't an edge.
+
+    Executors can walk the plan with next_ids/prev_ids, which only index into precomputed tuples, while
+    start/get_next/get_prev/end behave like QueryPlan's.  The returned lists are shared, so don't modify them.
+    """
+    __slots__ = ('events', 'index', 'next_offsets', 'next_targets', 'prev_offsets', 'prev_targets', 'kinds',
+                 'in_degree', 'start_ids', 'end_ids', 'streams_from', 'input_nodes', 'input_sources', '_next_ids',
+                 '_prev_ids', '_nexts', '_prevs')
+    ROOT = 0
+    def __init__(self, events, next_offsets, next_targets, prev_offsets, prev_targets, input_nodes=None,
+                 input_sources=None):
+        self.events = events
+        self.index = { x: i for i,x in enumerate(events) }
+        self.next_offsets = next_offsets
+        self.next_targets = next_targets
+        self.prev_offsets = prev_offsets
+        self.prev_targets = prev_targets
+        self.kinds = array('b', [ event_kind(x) for x in events ])
+        self._next_ids = tuple( tuple(next_targets[next_offsets[i]:next_offsets[i+1]]) for i in range(len(events)) )
+        self._prev_ids = tuple( tuple(prev_targets[prev_offsets[i]:prev_offsets[i+1]]) for i in range(len(events)) )
+        self._nexts = tuple( [events[j] for j in ids] for ids in self._next_ids )
+        self._prevs = tuple( [events[j] for j in ids] for ids in self._prev_ids )
+        self.in_degree = array('i', [ len(ids) for ids in self._prev_ids ])
+        self.start_ids = self._next_ids[self.ROOT]
+        self.end_ids = tuple( i for i in range(len(events)) if self._prev_ids[i] and not self._next_ids[i] )
+        self.streams_from = array('i', [ prevs[0] if kind == EDGE and len(prevs) == 1 and self.kinds[prevs[0]] == EDGE
+                                         else -1 for kind, prevs in zip(self.kinds, self._prev_ids) ])
+        self.input_nodes = input_nodes if input_nodes is not None else [None] * len(events)
+        self.input_sources = input_sources if input_sources is not None else array('i', [-1] * len(events))
+    @classmethod
+    def from_plan(cls, plan):
+        root = (frozenset(), frozenset())
+        index = {root: 0}
+        events = [root]
+        def intern(x):
+            if x not in index:
+                index[x] = len(events)
+                events.append(x)
+            return index[x]
+        nexts = [ (intern(x), [intern(n) for n in ns]) for x,ns in plan.nexts.items() ]
+        prevs = [ (intern(x), [intern(p) for p in ps]) for x,ps in plan.prevs.items() ]
+        input_nodes = [None] * len(events)
+        input_sources = array('i', [-1] * len(events))
+        for edge_id, (node, source) in plan.inputs().items():
+            if edge_id in index:
+                input_nodes[index[edge_id]] = node
+                input_sources[index[edge_id]] = index[source]
+        return cls(events, *csr(nexts, len(events)), *csr(prevs, len(events)), input_nodes, input_sources)
+    def relabel(self, node_map=None, edge_map=None):
+        """Return a copy of this plan with the query graph nodes and edges renamed, as QueryPlan.relabel.
+        Only the events change; the arrays are shared."""
+        memo = {}
+        events = [ relabel_event(x, node_map or {}, edge_map or {}, memo) for x in self.events ]
+        input_nodes = [ (node_map or {}).get(node, node) for node in self.input_nodes ]
+        return CompiledPlan(events, self.next_offsets, self.next_targets, self.prev_offsets, self.prev_targets,
+                            input_nodes, self.input_sources)
+    def __getstate__(self):
+        return (self.events, self.next_offsets, self.next_targets, self.prev_offsets, self.prev_targets,
+                self.input_nodes, self.input_sources)
+    def __setstate__(self, state):
+        self.__init__(*state)
+    def __len__(self):
+        return len(self.events)
+    def event_id(self, x):
+        return self.index[x]
+    def next_ids(self, i):
+        return self._next_ids[i]
+    def prev_ids(self, i):
+        return self._prev_ids[i]
+    def pipelines(self):
+        """Split the edges into maximal chains in which each edge streams from the one before it, and is the only
+        edge streaming from it.  Returns a list of tuples of edge ids."""
+        streaming_children = [ [] for _ in self.events ]
+        for i, parent in enumerate(self.streams_from):
+            if parent >= 0:
+                streaming_children[parent].append(i)
+        chains = []
+        for i, kind in enumerate(self.kinds):
+            parent = self.streams_from[i]
+            if kind != EDGE or (parent >= 0 and len(streaming_children[parent]) == 1):
+                continue
+            chain = [i]
+            while len(streaming_children[chain[-1]]) == 1:
+                chain.append(streaming_children[chain[-1]][0])
+            chains.append(tuple(self.events[j] for j in chain))
+        return chains
+    def start(self):
+        return self._nexts[self.ROOT]
+    def end(self):
+        return [ self.events[i] for i in self.end_ids ]
+    def get_next(self, x):
+        i = self.index.get(x)
+        if i is None:
+            return NO_NEXT
+        return self._nexts[i]
+    def get_prev(self, x):
+        i = self.index.get(x)
+        if i is None or not self._prev_ids[i]:
+            return self.events[self.ROOT]
+        return self._prevs[i]
+    def get_input(self, edge_id):
+        i = self.index.get(edge_id)
+        if i is None or self.input_sources[i] < 0:
+            return None
+        return self.input_nodes[i], self.events[self.input_sources[i]]
+
+def csr(adjacency, size):
+    """Given (i, [j...]) pairs, return the offsets and targets arrays"""
+    targets_of = [ [] for _ in range(size) ]
+    for i, js in adjacency:
+        targets_of[i].extend(js)
+    offsets = array('i', [0])
+    targets = array('i')
+    for js in targets_of:
+        targets.extend(js)
+        offsets.append(len(targets))
+    return offsets, targets
+
+def event_kind(x):
+    if isinstance(x, TerminalEvent):
+        return TERMINAL
+    if isinstance(x, (tuple, JoinEvent)):
+        return JOIN
+    return EDGE
@@ -0,0 +1,99 @@
+"""
+Planning a batch of query graphs at once.
+
+Each distinct shape in the batch is planned once (see PlanCache for what a shape is), by a pool of worker processes,
+and the plans for the other query graphs of that shape are renamed copies.  One-hops, chains and stars are quicker to
+plan than to ship to a worker, so they're planned in this process.  Plans come back compiled, which is compact to
+pickle and ready to execute.
+"""
+import os
+from functools import partial
+from multiprocessing import Pool
+
+from .generate_plan import generate_plan, trivial_plan
+from .query_graph import convert_to_graph
+from .plan_cache import shape_hash, shape_maps
+
+def generate_plans(query_graphs, workers=None, max_paths=None, max_path_length=None, pool=None, chunksize=32):
+    """Plan each of an iterable of TRAPI query graphs.  Returns a list with the list of CompiledPlans for each, in
+    order.  See iter_plans."""
+    return [ plans for i, plans in iter_plans(query_graphs, workers, max_paths, max_path_length, True, pool, chunksize) ]
+
+def iter_plans(query_graphs, workers=None, max_paths=None, max_path_length=None, ordered=False, pool=None,
+               chunksize=32):
+    """
+    Generate (index, list of CompiledPlans) for each of an iterable of TRAPI query graphs.  Unless ordered, they
+    come out as soon as they're ready.
+    workers is the number of processes to plan in (os.cpu_count() by default); with 0 or 1, everything is planned in
+    this process.  To save starting up a pool for every batch, pass in an existing multiprocessing Pool.  Query graphs
+    go to the workers up to chunksize at a time.
+    max_paths and max_path_length are as for generate_plan.
+    """
+    results = plan_batch(query_graphs, workers, max_paths, max_path_length, pool, chunksize)
+    if not ordered:
+        yield from results
+        return
+    finished = {}
+    next_index = 0
+    for i, plans in results:
+        finished[i] = plans
+        while next_index in finished:
+            yield next_index, finished.pop(next_index)
+            next_index += 1
+
+def plan_batch(query_graphs, workers, max_paths, max_path_length, pool, chunksize):
+    #hash -> [(index, graph)] of the first query graph of each shape, and index -> [(index, node map, edge map)]
+    # of the query graphs with the same shape as it
+    shapes = {}
+    copies = {}
+    work = []
+    for i, query_graph in enumerate(query_graphs):
+        graph = convert_to_graph(query_graph)
+        plans = trivial_plan(graph, max_paths, max_path_length)
+        if plans is not None:
+            yield i, [ plan.compile() for plan in plans ]
+            continue
+        bucket = shapes.setdefault(shape_hash(graph), [])
+        for first, template in bucket:
+            maps = shape_maps(template, graph)
+            if maps is not None:
+                copies[first].append( (i, *maps) )
+                break
+        else:
+            bucket.append( (i, graph) )
+            copies[i] = []
+            work.append( (i, planning_view(query_graph)) )
+    for i, plans in plan_work(work, workers, max_paths, max_path_length, pool, chunksize):
+        yield i, plans
+        for j, node_map, edge_map in copies.pop(i):
+            yield j, [ plan.relabel(node_map, edge_map) for plan in plans ]
+
+def plan_work(work, workers, max_paths, max_path_length, pool, chunksize):
+    """Plan a list of (index, query graph), generating (index, CompiledPlans) in whatever order they finish"""
+    task = partial(plan_chunk, max_paths=max_paths, max_path_length=max_path_length)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if not work:
+        return
+    if pool is None and (workers <= 1 or len(work) == 1):
+        yield from task(work)
+        return
+    if pool is None:
+        with Pool(workers) as pool:
+            yield from plan_work(work, workers, max_paths, max_path_length, pool, chunksize)
+        return
+    #Small enough chunks that every worker gets a few of them
+    size = max(1, min(chunksize, len(work) // (4 * workers)))
+    chunks = [ work[k:k+size] for k in range(0, len(work), size) ]
+    for results in pool.imap_unordered(task, chunks):
+        yield from results
+
+def plan_chunk(chunk, max_paths=None, max_path_length=None):
+    return [ (i, [ plan.compile() for plan in generate_plan(query_graph, max_paths, max_path_length) ])
+             for i, query_graph in chunk ]
+
+def planning_view(query_graph):
+    """Just the parts of a TRAPI query graph that the planner looks at, to keep what's sent to the workers small"""
+    return { 'nodes': { node: ({'ids': []} if 'ids' in props else {}) for node, props in query_graph['nodes'].items() },
+             'edges': { edge: {'subject': props['subject'], 'object': props['object']}
+                        for edge, props in query_graph['edges'].items() } }
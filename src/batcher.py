@@ -0,0 +1,121 @@
+"""
+Batching the lookups that a plan's edges make.
+
+Running an edge means looking up every id that reaches its input node.  Rather than a backend call per id, an
+EdgeBatcher collects the ids that every running edge asks for, and sends them in batches of up to max_batch ids,
+waiting at most max_wait seconds for a batch to fill.  An id that is already pending or has already been looked up
+for the same kind of request isn't sent again, so branches and plans that reach the same nodes share the work.
+
+The backend is anything with an async lookup(key, ids) method that returns a dict from each id to its results.
+ClientPool spreads the batches over a fixed set of such clients, so that each client has one request at a time.
+"""
+import asyncio
+
+from .plan_stats import count
+
+class EdgeBatcher:
+    """
+    Batches the lookups for the edges of a set of plans.  Use one per run: it remembers every id it has looked up.
+
+    key maps an edge id to whatever identifies the requests that edge makes (its predicate and categories, say),
+    and edges with the same key share their batches.  By default it is the edge id.  The client is called with the
+    key and a list of ids.
+
+    lookup(edge_id, ids) returns a dict from each of the ids to its results.  A batcher can also be the callback for
+    a PlanExecutor with prune: it is called with the edge id and the surviving ids of the edge's input node.
+    If stats (a PlanStats) is given, batches, ids_sent and ids_coalesced count the requests sent and saved.
+    """
+    def __init__(self, client, max_batch=1000, max_wait=0.01, key=None, stats=None):
+        self.client = client
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.key = key if key is not None else (lambda edge_id: edge_id)
+        self.stats = stats
+        #key -> id -> future of its results, for every id that has been asked for
+        self.futures = {}
+        #key -> ids waiting to be sent, and key -> the timer that will send them
+        self.pending = {}
+        self.timers = {}
+        self.sending = set()
+    async def __call__(self, edge_id, ids):
+        return await self.lookup(edge_id, ids)
+    async def lookup(self, edge_id, ids):
+        key = self.key(edge_id)
+        futures = self.futures.setdefault(key, {})
+        pending = self.pending.setdefault(key, [])
+        loop = asyncio.get_running_loop()
+        wanted = {}
+        for i in ids:
+            if i in wanted:
+                continue
+            if i in futures:
+                count(self.stats, 'ids_coalesced')
+            else:
+                futures[i] = loop.create_future()
+                pending.append(i)
+                if len(pending) >= self.max_batch:
+                    self.flush(key)
+                    pending = self.pending[key]
+            wanted[i] = futures[i]
+        if pending and key not in self.timers:
+            self.timers[key] = loop.call_later(self.max_wait, self.flush, key)
+        #Shielded, so that a caller giving up doesn't cancel the lookup for everyone else waiting on the same ids
+        results = await asyncio.gather(*map(asyncio.shield, wanted.values()))
+        return dict(zip(wanted, results))
+    def flush(self, key):
+        """Send whatever is waiting for key now, rather than when the batch fills or the timer goes off"""
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        ids = self.pending.get(key)
+        if not ids:
+            return
+        self.pending[key] = []
+        task = asyncio.ensure_future(self.send(key, ids))
+        self.sending.add(task)
+        task.add_done_callback(self.sending.discard)
+    async def send(self, key, ids):
+        count(self.stats, 'batches')
+        count(self.stats, 'ids_sent', len(ids))
+        futures = self.futures[key]
+        try:
+            results = await self.client.lookup(key, ids)
+        except Exception as e:
+            #Forget the ids, so that they can be asked for again
+            for i in ids:
+                future = futures.pop(i)
+                if not future.done():
+                    future.set_exception(e)
+                    #Whoever was waiting has been told
+                    future.exception()
+            return
+        except BaseException:
+            for i in ids:
+                futures.pop(i).cancel()
+            raise
+        for i in ids:
+            if not futures[i].done():
+                futures[i].set_result(results.get(i, []))
+    async def close(self):
+        """Send anything still waiting, and wait for everything that has been sent"""
+        for key in list(self.pending):
+            self.flush(key)
+        while self.sending:
+            await asyncio.gather(*self.sending, return_exceptions=True)
+
+class ClientPool:
+    """A client that hands each lookup to whichever of clients is free, waiting if none of them are"""
+    def __init__(self, clients):
+        self.clients = list(clients)
+        self.free = None
+    async def lookup(self, key, ids):
+        if self.free is None:
+            #Made here rather than in __init__, so that it belongs to the running event loop
+            self.free = asyncio.Queue()
+            for client in self.clients:
+                self.free.put_nowait(client)
+        client = await self.free.get()
+        try:
+            return await client.lookup(key, ids)
+        finally:
+            self.free.put_nowait(client)
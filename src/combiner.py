@@ -0,0 +1,99 @@
+"""
+Combining the results of independent plans.
+
+The answer to a query is the cartesian product of the results of the plans that generate_plan returns, which can be
+far too big to build.  CartesianProduct stands in for it without building it: it knows its length, can find the
+combination at any position, and pages through them with limit and offset.  ranked() goes through the combinations
+best first, by the sum of a score per result, holding only a heap of the candidates for the next best.
+"""
+from heapq import heappush, heappop
+from itertools import islice, product
+
+class CartesianProduct:
+    """
+    The combinations of one result from each of results (a list with a sequence of results for each plan), in the
+    order of itertools.product: the last plan's results change fastest.  Each combination is a tuple with a result
+    from each plan, or whatever combine makes of that tuple (merging result dicts, say).
+    """
+    def __init__(self, results, combine=None):
+        self.results = [ r if hasattr(r, '__getitem__') else list(r) for r in results ]
+        self.combine = combine
+        self.length = 1
+        for r in self.results:
+            self.length *= len(r)
+    def __len__(self):
+        return self.length
+    def __iter__(self):
+        return map(self.output, product(*self.results))
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.length)
+            return [ self[j] for j in range(start, stop, step) ]
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError('CartesianProduct index out of range')
+        #Mixed radix: each plan's index is one digit, with the last plan's the least significant
+        combination = []
+        for r in reversed(self.results):
+            i, digit = divmod(i, len(r))
+            combination.append(r[digit])
+        return self.output(tuple(reversed(combination)))
+    def page(self, offset=0, limit=None):
+        """Generate the combinations from offset on, at most limit of them.  Only the first is found by indexing;
+        the rest follow on from it, like an odometer."""
+        stop = self.length if limit is None else min(self.length, offset + limit)
+        if offset >= stop:
+            return
+        digits = []
+        i = offset
+        for r in reversed(self.results):
+            i, digit = divmod(i, len(r))
+            digits.append(digit)
+        digits.reverse()
+        for _ in range(stop - offset):
+            yield self.output(tuple( r[d] for r, d in zip(self.results, digits) ))
+            for p in range(len(digits) - 1, -1, -1):
+                digits[p] += 1
+                if digits[p] < len(self.results[p]):
+                    break
+                digits[p] = 0
+    def output(self, combination):
+        return combination if self.combine is None else self.combine(combination)
+
+def ranked(results, score, combine=None):
+    """
+    Generate the combinations of one result from each of results, highest scoring first, where a combination scores
+    the sum of score(result) over its results.  Each plan's results are sorted once; after that, each combination
+    costs a heap operation or two, so taking the top k of a huge product is cheap (see top_k).
+    """
+    orders = []
+    scores = []
+    for r in results:
+        r = list(r)
+        row_scores = [ score(x) for x in r ]
+        order = sorted(range(len(r)), key=lambda j: -row_scores[j])
+        orders.append([ r[j] for j in order ])
+        scores.append([ row_scores[j] for j in order ])
+    if any(not r for r in orders):
+        return
+    #Each combination is a list of positions in the sorted results.  Every combination other than the best has a
+    # single parent: the same positions, with the last nonzero one decreased by one.  Only children that move a
+    # position at or after the last nonzero one are pushed, so each combination is pushed once, by its parent.
+    start = (0,) * len(orders)
+    heap = [ (-sum(s[0] for s in scores), 0, start, 0) ]
+    pushed = 1
+    while heap:
+        negative, _, positions, last = heappop(heap)
+        combination = tuple( r[p] for r, p in zip(orders, positions) )
+        yield (-negative, combination if combine is None else combine(combination))
+        for j in range(last, len(orders)):
+            if positions[j] + 1 < len(orders[j]):
+                child = positions[:j] + (positions[j] + 1,) + positions[j+1:]
+                change = scores[j][positions[j] + 1] - scores[j][positions[j]]
+                heappush(heap, (negative - change, pushed, child, j))
+                pushed += 1
+
+def top_k(results, k, score, combine=None):
+    """The k highest scoring combinations, as (score, combination) pairs, best first"""
+    return list(islice(ranked(results, score, combine), k))
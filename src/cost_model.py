@@ -0,0 +1,43 @@
+class CostModel:
+    """
+    Estimates of result sizes, for cost-based planning.
+
+    node_sizes maps query node ids to the number of ids expected for that node, and edge_fanouts maps edge ids to
+    the number of results expected per input id.  predicate_fanouts gives the fan-out of a predicate, which is used
+    for edges that aren't in edge_fanouts; an edge with several predicates gets the sum.  Anything we know nothing
+    about gets default_size or default_fanout.
+
+    for_query_graph fills in the sizes of the bound nodes from the length of their ids, and the predicates of the
+    edges, from a TRAPI query graph.
+    """
+    def __init__(self, node_sizes=None, edge_fanouts=None, predicate_fanouts=None, default_size=1000, default_fanout=100):
+        self.node_sizes = dict(node_sizes or {})
+        self.edge_fanouts = dict(edge_fanouts or {})
+        self.predicate_fanouts = dict(predicate_fanouts or {})
+        self.default_size = default_size
+        self.default_fanout = default_fanout
+    def for_query_graph(self, query_graph):
+        node_sizes = { node: len(props['ids']) for node, props in query_graph['nodes'].items() if props.get('ids') }
+        node_sizes.update(self.node_sizes)
+        edge_fanouts = {}
+        for edge, props in query_graph['edges'].items():
+            if props.get('predicates'):
+                edge_fanouts[edge] = sum(self.predicate_fanouts.get(p, self.default_fanout) for p in props['predicates'])
+        edge_fanouts.update(self.edge_fanouts)
+        return CostModel(node_sizes, edge_fanouts, self.predicate_fanouts, self.default_size, self.default_fanout)
+    def node_size(self, node):
+        return self.node_sizes.get(node, self.default_size)
+    def edge_fanout(self, edge_id):
+        return self.edge_fanouts.get(edge_id, self.default_fanout)
+    def hop_fanout(self, edge_ids):
+        """The fan-out of a hop over parallel edges.  Results have to match all of them, so it is the smallest."""
+        return min(map(self.edge_fanout, edge_ids))
+    def walk_costs(self, node, hops):
+        """The running total of intermediate results from walking the hops in order, starting from node.  Each hop
+        is the list of edge ids between a pair of nodes.  The first entry is 0, for not walking at all."""
+        size = self.node_size(node)
+        costs = [0]
+        for edge_ids in hops:
+            size *= self.hop_fanout(edge_ids)
+            costs.append(costs[-1] + size)
+        return costs
@@ -0,0 +1,254 @@
+import asyncio
+
+from .QueryPlan import CompiledPlan, EDGE, JOIN
+
+class PlanExecutor:
+    """
+    Runs the plans returned by generate_plan.
+
+    callback is an async function that is called with an edge id and does whatever it takes to run that edge.
+    The plans are independent so they all run at once, and within a plan an event runs as soon as everything
+    upstream of it (its get_prev) has finished.  That makes every join a barrier; on_join, if given, is an async
+    function called with the join once all its parents are done, before anything downstream of it starts.
+    Terminal events just end their branch.
+
+    max_concurrency limits how many edges run at once across all the plans, and max_per_plan how many run at once
+    within each plan.
+
+    prune, if given, keeps later hops from fanning out of ids that a join has already eliminated.  Before an edge
+    runs, it is called with the edge's input node, the event that has the final say on that node's ids (see
+    QueryPlan.get_input), and that event's result: the callback's result for an edge, on_join's for a join, or
+    None for the start of the plan, where the node is bound.  It returns the ids that survive, and the callback is
+    called with the edge id and those ids.  If the plan doesn't know the edge's input, the ids are None.
+    """
+    def __init__(self, plans, callback, max_concurrency=None, max_per_plan=None, on_join=None, prune=None):
+        self.plans = [ plan if isinstance(plan, CompiledPlan) else plan.compile() for plan in plans ]
+        self.callback = callback
+        self.on_join = on_join
+        self.prune = prune
+        self.max_concurrency = max_concurrency
+        self.max_per_plan = max_per_plan
+    async def run(self):
+        """Run all the plans.  Returns a list with a dict for each plan, from edge id to the callback's result.
+        If a callback fails, everything else is cancelled and the exception is raised."""
+        limits = [asyncio.Semaphore(self.max_concurrency)] if self.max_concurrency else []
+        tasks = [ asyncio.ensure_future(self.run_plan(plan, limits)) for plan in self.plans ]
+        await wait_all(tasks)
+        return [ task.result() for task in tasks ]
+    async def run_plan(self, plan, limits):
+        if self.max_per_plan:
+            limits = limits + [asyncio.Semaphore(self.max_per_plan)]
+        return await self.plan_run(plan, limits).run()
+    def plan_run(self, plan, limits):
+        return PlanRun(self, plan, limits)
+
+class PlanRun:
+    """The state of one plan while a PlanExecutor is running it"""
+    def __init__(self, executor, plan, limits):
+        self.executor = executor
+        self.plan = plan
+        self.limits = limits
+        self.results = {}
+        #event -> on_join's result, for prune
+        self.join_results = {}
+        self.waiting = list(plan.in_degree)
+        #task -> event
+        self.running = {}
+    async def run(self):
+        self.finished(self.plan.ROOT)
+        try:
+            while self.running:
+                done, _ = await asyncio.wait(self.running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i = self.running.pop(task)
+                    result = task.result()
+                    if self.plan.kinds[i] == EDGE:
+                        self.results[self.plan.events[i]] = result
+                    elif self.executor.prune is not None:
+                        self.join_results[i] = result
+                    self.task_done(i)
+        except BaseException:
+            await cancel(self.running)
+            raise
+        return self.results
+    def task_done(self, i):
+        self.finished(i)
+    def finished(self, i):
+        for j in self.plan.next_ids(i):
+            self.waiting[j] -= 1
+            if self.waiting[j] == 0:
+                self.ready(j)
+    def ready(self, i):
+        kind = self.plan.kinds[i]
+        if kind == EDGE and self.executor.prune is not None:
+            self.launch(i, limited(self.run_pruned, i, self.limits))
+        elif kind == EDGE:
+            self.launch(i, limited(self.executor.callback, self.plan.events[i], self.limits))
+        elif kind == JOIN and self.executor.on_join is not None:
+            self.launch(i, self.executor.on_join(self.plan.events[i]))
+        else:
+            self.finished(i)
+    def launch(self, i, coroutine):
+        self.running[asyncio.ensure_future(coroutine)] = i
+    async def run_pruned(self, i):
+        return await self.executor.callback(self.plan.events[i], self.surviving_ids(i))
+    def surviving_ids(self, i):
+        source = self.plan.input_sources[i]
+        if source < 0:
+            return None
+        if self.plan.kinds[source] == EDGE:
+            result = self.results[self.plan.events[source]]
+        else:
+            result = self.join_results.get(source)
+        return self.executor.prune(self.plan.input_nodes[i], self.plan.events[source], result)
+
+class StreamingPlanExecutor(PlanExecutor):
+    """
+    A PlanExecutor that pipelines edges that don't have to wait on a join (see CompiledPlan.streams_from).
+
+    Here callback is an async generator function, called with an edge id and the upstream batches, that yields
+    batches of results.  For an edge that streams from another edge, upstream is an async iterator over that edge's
+    batches, delivered as soon as they are yielded, through a queue of at most queue_size batches.  For any other
+    edge, upstream is None and the edge starts once everything upstream of it has finished, as in PlanExecutor.
+
+    A whole pipeline of streaming edges counts as one edge against the concurrency limits: it takes its turn when
+    its first edge starts, and holds it until its last edge ends.  None of its edges run before then.  The results
+    are the lists of batches from each edge, unless keep_results is False.
+
+    With prune, an edge that doesn't stream gets the surviving ids of its input node as its upstream, instead of
+    None.  Edges that stream already only see the results of the edge they stream from.
+    """
+    def __init__(self, plans, callback, max_concurrency=None, max_per_plan=None, on_join=None, queue_size=8,
+                 keep_results=True, prune=None):
+        super().__init__(plans, callback, max_concurrency, max_per_plan, on_join, prune)
+        self.queue_size = queue_size
+        self.keep_results = keep_results
+    def plan_run(self, plan, limits):
+        return StreamingRun(self, plan, limits)
+
+#Marks the end of a stream of batches
+DONE = object()
+
+class StreamingRun(PlanRun):
+    def __init__(self, executor, plan, limits):
+        super().__init__(executor, plan, limits)
+        self.started = set()
+        #Streaming edges whose own task has ended, and those whose parent has finished.  A streaming edge is only
+        # finished once both have happened, so that nothing downstream of it starts while it is still running.
+        self.ended = set()
+        self.parent_done = set()
+    def task_done(self, i):
+        if self.plan.streams_from[i] >= 0 and i not in self.parent_done:
+            self.ended.add(i)
+        else:
+            self.finished(i)
+    def ready(self, i):
+        if i in self.started:
+            #Already streaming from its parent
+            self.parent_done.add(i)
+            if i in self.ended:
+                self.finished(i)
+        elif self.plan.kinds[i] == EDGE:
+            upstream = self.surviving_ids(i) if self.executor.prune is not None else None
+            self.stream(i, upstream, Pipeline(self.limits))
+        else:
+            super().ready(i)
+    def stream(self, i, upstream, pipeline):
+        self.started.add(i)
+        pipeline.members += 1
+        queues = []
+        for j in self.plan.next_ids(i):
+            if self.plan.streams_from[j] == i:
+                queue = asyncio.Queue(self.executor.queue_size)
+                queues.append(queue)
+                self.stream(j, Upstream(queue), pipeline)
+        self.launch(i, pipeline.run(self.run_edge, (i, upstream, queues)))
+    async def run_edge(self, args):
+        i, upstream, queues = args
+        batches = []
+        async for batch in self.executor.callback(self.plan.events[i], upstream):
+            for queue in queues:
+                await queue.put(batch)
+            if self.executor.keep_results:
+                batches.append(batch)
+        for queue in queues:
+            await queue.put(DONE)
+        if isinstance(upstream, Upstream):
+            #In case the callback stopped listening early, don't leave the upstream edge stuck on a full queue
+            async for batch in upstream:
+                pass
+        return batches if self.executor.keep_results else None
+
+class Upstream:
+    """Iterates over the batches coming from an upstream edge"""
+    def __init__(self, queue):
+        self.queue = queue
+        self.done = False
+    def __aiter__(self):
+        return self
+    async def __anext__(self):
+        if not self.done:
+            batch = await self.queue.get()
+            if batch is not DONE:
+                return batch
+            self.done = True
+        raise StopAsyncIteration
+
+class Pipeline:
+    """One turn of the concurrency limits, shared by the edges of a pipeline.  It is taken when the first of them
+    starts, and given back when the last of them ends."""
+    def __init__(self, limits):
+        self.limits = limits
+        self.members = 0
+        self.acquiring = None
+    async def run(self, func, arg):
+        try:
+            if self.acquiring is None:
+                self.acquiring = asyncio.ensure_future(acquire(self.limits))
+            await asyncio.shield(self.acquiring)
+            return await func(arg)
+        finally:
+            self.members -= 1
+            if self.members == 0:
+                if not self.acquiring.done():
+                    self.acquiring.cancel()
+                elif not self.acquiring.cancelled() and self.acquiring.exception() is None:
+                    release(self.limits)
+
+async def limited(func, arg, limits):
+    await acquire(limits)
+    try:
+        return await func(arg)
+    finally:
+        release(limits)
+
+async def acquire(limits):
+    """Acquire all of the limits, or if that is interrupted, none of them"""
+    acquired = []
+    try:
+        for limit in limits:
+            await limit.acquire()
+            acquired.append(limit)
+    except BaseException:
+        release(acquired)
+        raise
+
+def release(limits):
+    for limit in limits:
+        limit.release()
+
+async def wait_all(tasks):
+    """Wait for all the tasks, but if any of them fail, cancel the others and raise"""
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    except BaseException:
+        await cancel(tasks)
+        raise
+
+async def cancel(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,17 +1,73 @@
-from .query_graph import convert_to_networkx
-from .QueryPlan import QueryPlan, TerminalEvent
-
-import networkx as nx
-from collections import defaultdict
-
-def generate_plan(trapi_query_graph):
-    nxgraph = convert_to_networkx(trapi_query_graph)
-    double_pins, components = decompose(nxgraph)
-    plan = double_pins #these are already query plans
-    for component in components:
-        component_plan = generate_component_plan(component)
-        plan.append(component_plan)
-    return plan
+from .query_graph import convert_to_graph, convert_to_networkx, get_edge_ids
+from .QueryPlan import QueryPlan, TerminalEvent, JoinEvent
+from .plan_stats import stage, count
+from . import graph as graphs
+
+import heapq
+import time
+from collections import defaultdict, deque
+from itertools import groupby, islice
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait as wait_connections
+
+def generate_plan(trapi_query_graph, max_paths=None, max_path_length=None, cache=None, cost_model=None, stats=None,
+                  backend=None, workers=None, component_timeout=None, time_budget=None):
+    """max_paths and max_path_length bound the path/cycle enumeration in each component.  See generate_simple_plan
+    If a PlanCache is given, plans for query graphs of a shape that has been planned before come from the cache.
+    If a CostModel is given, it is used to order the paths and decide where to join them.  These plans depend on
+    more than the shape of the query graph, so they are not cached.
+    If a PlanStats is given, it records the time spent in each stage of planning.
+    One-hops, chains and stars are planned directly (see trivial_plan), giving the same plans as the general case.
+    Planning is done on our own lightweight Graph; backend='networkx' does it on networkx graphs instead, for
+    cross-checking.  Either way, paths are found by graph.shortest_simple_paths rather than networkx's, so that
+    both backends take paths of the same length in the same order; it is checked against networkx's separately.
+    With workers, independent components are planned concurrently in that many processes, and any component that
+    isn't planned within component_timeout seconds gets a quick bfs_plan instead.  See plan_components.
+    time_budget bounds the time spent looking for paths, in seconds.  When it runs out, whatever paths have been
+    found so far are kept, and the rest of each component is walked breadth first (see add_bfs)."""
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    with stage(stats, 'generate_plan'):
+        with stage(stats, 'convert'):
+            if backend == 'networkx':
+                nxgraph = convert_to_networkx(trapi_query_graph)
+            else:
+                nxgraph = convert_to_graph(trapi_query_graph)
+        if cost_model is not None:
+            cost_model = cost_model.for_query_graph(trapi_query_graph)
+            cache = None
+        else:
+            with stage(stats, 'trivial_plan'):
+                plan = trivial_plan(nxgraph, max_paths, max_path_length)
+            if plan is not None:
+                return plan
+        if cache is not None:
+            options = (max_paths, max_path_length)
+            with stage(stats, 'cache'):
+                plan = cache.get(nxgraph, options)
+            if plan is not None:
+                return plan
+        with stage(stats, 'decompose'):
+            double_pins, components = decompose(nxgraph)
+        plan = double_pins #these are already query plans
+        if workers:
+            component_plans, complete = plan_components(components, workers, component_timeout, max_paths,
+                                                        max_path_length, cost_model, stats, deadline)
+            plan.extend(component_plans)
+            if not complete:
+                #Don't hang on to the fallbacks
+                cache = None
+        else:
+            for component in components:
+                component_plan = generate_component_plan(component, max_paths, max_path_length, cost_model, stats,
+                                                         deadline)
+                plan.append(component_plan)
+        if deadline is not None and time.monotonic() > deadline:
+            #Some of the plans may be fallbacks
+            cache = None
+        if cache is not None:
+            with stage(stats, 'cache'):
+                cache.put(nxgraph, plan, options)
+        return plan
 
 def nodes_to_component( nodeset, master_graph, boundnodes ):
     """Given a set of nodes, find the induced subgraph that includes that list of nodes plus any
@@ -46,10 +102,9 @@ def decompose(graph):
             direct_edges.append((u,v))
     double_pins = []
     for u,v in direct_edges:
-        edge_id = graph.get_edge_data(u,v)['edge_id']
         plan = QueryPlan()
-        plan.add_simple_dependency((frozenset(),frozenset()),edge_id)
-        plan.add_simple_dependency(edge_id, TerminalEvent("double pin"))
+        last = plan.add_edges((frozenset(),frozenset()), u, v, get_edge_ids(graph.get_edge_data(u,v)))
+        plan.add_simple_dependency(last, TerminalEvent("double pin"))
         double_pins.append(plan)
         clean_graph.remove_edge(u,v)
     if clean_graph.number_of_edges() == 0:
@@ -58,71 +113,232 @@ def decompose(graph):
     bound_nodes = get_bound_nodes(working_graph)
     working_graph.remove_nodes_from(bound_nodes)
     #having removed the bound nodes, do we have independent components?
-    if nx.is_connected(working_graph):
+    if graphs.is_connected(working_graph):
         return double_pins , [clean_graph]
-    node_components = nx.connected_components(working_graph)
+    node_components = graphs.connected_components(working_graph)
     #Each component is a list of nodes.  We want to make them back into graphs, but we want them to include
     # the bound node where appropriate.
     components = [ nodes_to_component( nc, clean_graph, bound_nodes) for nc in node_components ]
     return double_pins, components
 
-def generate_component_plan(component):
-    hairs,bald_head = dehair(component)
-    plan,traversed_graph = generate_simple_plan(bald_head)
+def trivial_plan(graph, max_paths=None, max_path_length=None):
+    """Most queries are one or two hops.  If the graph is a single edge, a chain bound at one or both ends, or a star
+    around a bound hub, build the plans that decompose, dehair and generate_simple_plan would, without going through
+    them.  Returns None for anything else."""
+    node_count = graph.number_of_nodes()
+    edge_count = graph.number_of_edges()
+    if edge_count == 0 or edge_count != node_count - 1 or not graphs.is_connected(graph):
+        return None
+    bound_nodes = get_bound_nodes(graph)
+    degree = graph.degree
+    if len(bound_nodes) == 1 and degree[bound_nodes[0]] == edge_count:
+        #A star (or one-hop).  Without the hub, every leaf is its own component, with a plan that is all hair.
+        hub = bound_nodes[0]
+        return [ hair_plan(graph, [hub, leaf]) for leaf in graph if leaf != hub ]
+    if any(degree[node] > 2 for node in graph) or not all(degree[node] == 1 for node in bound_nodes):
+        return None
+    if not bound_nodes:
+        return None
+    if len(bound_nodes) == 1:
+        return [ hair_plan(graph, walk_chain(graph, bound_nodes[0])) ]
+    #Bound at both ends
+    if edge_count == 1:
+        u, v = next(iter(graph.edges()))
+        plan = QueryPlan()
+        last = plan.add_edges((frozenset(),frozenset()), u, v, get_edge_ids(graph.get_edge_data(u,v)))
+        plan.add_simple_dependency(last, TerminalEvent("double pin"))
+        return [plan]
+    if (max_paths is not None and max_paths < 1) or (max_path_length is not None and max_path_length < edge_count):
+        return None
+    plan = QueryPlan()
+    process_path(graph, walk_chain(graph, bound_nodes[0]), plan, { 'nodes': set(), 'edges': set()})
+    return [plan]
+
+def walk_chain(graph, end):
+    """The nodes of a chain, in order from one of its ends"""
+    path = [end]
+    previous = None
+    while True:
+        following = [ node for node in graph.neighbors(path[-1]) if node != previous ]
+        if not following:
+            return path
+        previous = path[-1]
+        path.append(following[0])
+
+def hair_plan(graph, path):
+    """A plan that walks the path from its start, as dehair plans a hair"""
+    plan = QueryPlan()
+    last = (frozenset(), frozenset())
+    for u,v in zip(path, path[1:]):
+        last = plan.add_edges(last, u, v, get_edge_ids(graph.get_edge_data(u,v)))
+    plan.add_simple_dependency(last, TerminalEvent('Hair'))
+    return plan
+
+def plan_components(components, workers, timeout=None, max_paths=None, max_path_length=None, cost_model=None,
+                    stats=None, deadline=None):
+    """Plan the components in up to workers processes at once, one process per component.  Each component gets
+    timeout seconds from when its own process starts, so a slow component doesn't eat into the time of the ones
+    queued behind it.  When a component runs out of time, its process is killed and it gets a bfs_plan.
+    Returns the plans, in the same order as the components, and whether they all finished."""
+    plans = [None] * len(components)
+    complete = True
+    with stage(stats, 'plan_components'):
+        queued = deque(range(len(components)))
+        #connection -> (component index, process, when it has to be done by)
+        running = {}
+        try:
+            while queued or running:
+                while queued and len(running) < workers:
+                    i = queued.popleft()
+                    receiver, sender = Pipe(duplex=False)
+                    process = Process(target=plan_component, daemon=True,
+                                      args=(sender, components[i], max_paths, max_path_length, cost_model, deadline))
+                    process.start()
+                    sender.close()
+                    running[receiver] = (i, process, None if timeout is None else time.monotonic() + timeout)
+                deadlines = [ until for i, process, until in running.values() if until is not None ]
+                wait_for = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+                for receiver in wait_connections(list(running), wait_for):
+                    i, process, until = running.pop(receiver)
+                    try:
+                        failed, result = receiver.recv()
+                    except EOFError:
+                        raise RuntimeError(f'Planning component {i} failed with exit code {process.exitcode}')
+                    finally:
+                        receiver.close()
+                        process.join()
+                    if failed:
+                        raise result
+                    plans[i] = result
+                now = time.monotonic()
+                for receiver, (i, process, until) in list(running.items()):
+                    if until is not None and now >= until and not receiver.poll():
+                        del running[receiver]
+                        process.terminate()
+                        process.join()
+                        receiver.close()
+                        count(stats, 'component_timeouts')
+                        plans[i] = bfs_plan(components[i])
+                        complete = False
+        finally:
+            for receiver, (i, process, until) in running.items():
+                process.terminate()
+                process.join()
+                receiver.close()
+    return plans, complete
+
+def plan_component(sender, component, max_paths, max_path_length, cost_model, deadline):
+    """Runs in a child process of plan_components, and sends back (whether it failed, the plan or the exception)"""
+    try:
+        result = (False, generate_component_plan(component, max_paths, max_path_length, cost_model, None, deadline))
+    except Exception as e:
+        result = (True, e)
+    sender.send(result)
+    sender.close()
+
+def bfs_plan(component):
+    """A plan for any component that is quick to make: walk out from the bound nodes, breadth first"""
+    plan = QueryPlan()
+    add_bfs(component, plan, { 'nodes': set(), 'edges': set() })
+    return plan
+
+def add_bfs(g, dep_graph, traversed_subgraph):
+    """Cover the edges of g that haven't been traversed by walking out breadth first from the traversed subgraph
+    (that is, from the join at the end of dep_graph) and from any bound nodes that haven't been reached.
+    The edges left over close loops, so they run once everything else has been joined, and then everything is
+    joined."""
+    root = (frozenset(), frozenset())
+    last = freeze_subgraph(traversed_subgraph) if traversed_subgraph['edges'] else root
+    #node -> the event that reached it
+    reached = {}
+    for node in g:
+        if node in traversed_subgraph['nodes']:
+            reached[node] = last
+        elif g.nodes[node]['bound']:
+            reached[node] = root
+    frontier = deque(reached)
+    walked = set(traversed_subgraph['edges'])
+    ends = []
+    while frontier:
+        node = frontier.popleft()
+        for neighbor, edge_data in g.adj[node].items():
+            if neighbor not in reached:
+                reached[neighbor] = dep_graph.add_edges(reached[node], node, neighbor, get_edge_ids(edge_data))
+                walked.update(get_edge_ids(edge_data))
+                ends.append(reached[neighbor])
+                frontier.append(neighbor)
+    ends = [ x for x in ends if x not in dep_graph.nexts ]
+    leftovers = [ (u, v, get_edge_ids(edge_data)) for u, v, edge_data in g.edges(data=True)
+                  if not walked.issuperset(get_edge_ids(edge_data)) ]
+    new_nodes = [ node for node in reached if node not in traversed_subgraph['nodes'] ]
+    new_edges = walked - traversed_subgraph['edges']
+    traversed_subgraph['nodes'].update(new_nodes)
+    traversed_subgraph['edges'].update(new_edges)
+    if not leftovers:
+        terminus = TerminalEvent('BFS')
+        for end in ends:
+            dep_graph.add_simple_dependency(end, terminus)
+        return
+    if last != root and last not in dep_graph.nexts:
+        ends.append(last)
+    if new_edges:
+        #If nothing new was walked, the leftovers can go straight from last; a join of nothing new would equal it
+        last = join_subgraph(traversed_subgraph, new_nodes, new_edges)
+        for end in ends:
+            dep_graph.add_simple_dependency(end, last)
+    new_nodes = [ node for node in g if node not in traversed_subgraph['nodes'] ]
+    new_edges = [ edge_id for u, v, edge_ids in leftovers for edge_id in edge_ids if edge_id not in walked ]
+    traversed_subgraph['nodes'].update(new_nodes)
+    traversed_subgraph['edges'].update(new_edges)
+    everything = join_subgraph(traversed_subgraph, new_nodes, new_edges)
+    for u, v, edge_ids in leftovers:
+        dep_graph.add_simple_dependency(dep_graph.add_edges(last, u, v, edge_ids), everything)
+
+def generate_component_plan(component, max_paths=None, max_path_length=None, cost_model=None, stats=None,
+                            deadline=None):
+    with stage(stats, 'dehair'):
+        hairs,bald_head = dehair(component)
+    plan,traversed_graph = generate_simple_plan(bald_head, max_paths, max_path_length, cost_model, stats, deadline)
     plan.add_hairs(hairs)
     return plan
 
-def next_hair(component):
-    for node,nd in component.nodes(data=True):
-        if component.degree[node] == 1 and not nd['bound']:
-            return node
-    return None
+def is_hair(component, node):
+    return component.degree[node] == 1 and not component.nodes[node]['bound']
 
-#TODO: Maybe I need to build this one in a graph before moving it into a QueryPlan?
-# The problem is that I'm building it by plucking off edges, but not in any partuclar order
-#  therefore making it hard to track dependencies
 def dehair(component):
     """The important thing about these hairs is that there are no constraints to apply.
     You can't do any better than starting at the bound end and walking forward."""
-    #Hair is defined by degree 1 nodes.  As these are removed, more nodes become degree 1, so we backwalk
-    # until it's all gone
-    dangler = next_hair(component)
-    dep_graph = defaultdict(list)
-    while dangler is not None:
-        cut_edge = list(component.edges(dangler,data=True))[0]
-        edge_id =cut_edge[2]['edge_id']
-        other_node = next(component.neighbors(dangler))
-        dep_graph[other_node].append(cut_edge[2]['edge_id'])
-        dep_graph[cut_edge[2]['edge_id']].append(dangler)
+    #Hair is defined by degree 1 nodes.  As these are removed, more nodes become degree 1, so we keep a queue of
+    # them, and backwalk until it's all gone.  Each node and edge is only touched a constant number of times.
+    danglers = deque(node for node in component if is_hair(component,node))
+    #node -> (edge ids, node) for the edges that were cut off of it, and the nodes they lead out to
+    cuts = defaultdict(list)
+    while danglers:
+        dangler = danglers.popleft()
+        if component.degree[dangler] != 1:
+            #Whatever was on the other end has been cut off as well
+            continue
+        other_node, edge_data = next(iter(component.adj[dangler].items()))
+        cuts[other_node].append( (get_edge_ids(edge_data), dangler) )
         component.remove_node(dangler)
-        dangler = next_hair(component)
-    #Because we went backwards, and because it was easier to keep track of, our depedency graph has nodes in it
-    # but there's no event associated with these nodes; no joins are required.
-    # So remove them from the dep graph to make the query plan
-    tos = set(sum( list(dep_graph.values()), [] ))
-    froms = set(dep_graph.keys())
-    start_nodes = froms.difference(tos)
-    #Get to the edges
-    starts = set(sum( [dep_graph[n] for n in start_nodes], [] ))
-    #The current dep_graph has both edges and nodes, but lets take out the nodes now
+        if is_hair(component, other_node):
+            danglers.append(other_node)
+    #Because we went backwards, our cuts are keyed by nodes but there's no event associated with these nodes;
+    # no joins are required.  The hairs start at the nodes that are still in the component.
     plan = QueryPlan()
-    for start in starts:
-        plan.add_simple_dependency( (frozenset(), frozenset()), start )
     #The plan will have some terminal events as well, so that we have some dependency for the final edge.
     terminus = TerminalEvent('Hair')
-    while len(starts) > 0:
-        start = starts.pop()
-        next_nodes = dep_graph[start]
-        for node in next_nodes:
-            if node not in dep_graph:
-                plan.add_simple_dependency(start,terminus)
-            else:
-                for next_edge in dep_graph[node]:
-                    plan.add_simple_dependency(start,next_edge)
-                    starts.add(next_edge)
+    pending = deque( ((frozenset(), frozenset()), node, cut) for node in cuts if node in component for cut in cuts[node] )
+    while pending:
+        last, node, (edge_ids, next_node) = pending.popleft()
+        last = plan.add_edges(last, node, next_node, edge_ids)
+        if next_node not in cuts:
+            plan.add_simple_dependency(last,terminus)
+        else:
+            pending.extend( (last, next_node, cut) for cut in cuts[next_node] )
     return plan,component
 
-def generate_simple_plan(g):
+def generate_simple_plan(g, max_paths=None, max_path_length=None, cost_model=None, stats=None, deadline=None):
     """
     By this point, we have a single, bald, interdependent component.  It may have loops and/or branches, and
     will contain one or more bound nodes.
@@ -133,32 +349,133 @@ def generate_simple_plan(g):
     We also need to manage dependencies among the paths.
 
     This won't necessarily cover everything, (like hairs with loops at the end)
-    so we need a bit of fail-safedness at the end"""
-    #Stopping condition is when we have crossed all edges
-    edge_count = g.number_of_edges()
-    #First find all the simple paths and cycles
-    paths = get_paths(g) + get_cycles(g)
-    paths_with_length = [ (len(x),x) for x in paths ]
-    paths_with_length.sort()
-    #dep_graph = defaultdict(list)
+    so we need a bit of fail-safedness at the end
+
+    The paths are generated lazily, so we only pay for the paths we actually look at.  max_paths limits the number
+    of paths and cycles considered, and max_path_length (in edges) the longest one.  If either budget runs out
+    before every edge is covered, the rest of the graph is walked breadth first, as for the deadline below.
+
+    With a cost model, paths of the same length are taken cheapest first, and each path is split where the
+    estimated intermediate results from walking in from its two ends are smallest (see split_path).
+
+    If the deadline (a time.monotonic() time) passes, we stop looking for paths, and walk the rest of the graph
+    breadth first from what we've got."""
+    #Stopping condition is when we have crossed all edges, counting each of a set of parallel edges
+    edge_count = sum(len(get_edge_ids(edge_data)) for u, v, edge_data in g.edges(data=True))
+    #Shortest paths and cycles first
+    paths = candidate_paths(g, max_path_length, stats, deadline)
+    if max_paths is not None:
+        paths = islice(paths, max_paths)
     dep_graph = QueryPlan()
     traversed_subgraph = { 'nodes': set(), 'edges': set()}
-    for l,path in paths_with_length:
-        process_path(g, path, dep_graph, traversed_subgraph )
+    if cost_model is not None:
+        paths = cheapest_first(g, paths, traversed_subgraph, cost_model)
+    for path in paths:
         if len(traversed_subgraph['edges']) == edge_count:
             break
+        with stage(stats, 'process_path'):
+            process_path(g, path, dep_graph, traversed_subgraph, cost_model, stats)
+    merge_heads(dep_graph, traversed_subgraph, stats)
+    if len(traversed_subgraph['edges']) < edge_count:
+        if deadline is not None and time.monotonic() > deadline:
+            count(stats, 'deadline_fallbacks')
+        else:
+            count(stats, 'budget_fallbacks')
+        with stage(stats, 'add_bfs'):
+            add_bfs(g, dep_graph, traversed_subgraph)
     return dep_graph,traversed_subgraph
 
-def process_path(graph,path,dep_graph,traversed_subgraph):
+def cheapest_first(g, paths, traversed_subgraph, cost_model):
+    """Reorder each length's worth of paths by the estimated cost of walking whatever is left of them"""
+    for length, group in groupby(paths, key=len):
+        yield from sorted(group, key=lambda path: path_cost(g, trim_path(g, path, traversed_subgraph), cost_model))
+
+def process_path(graph,path,dep_graph,traversed_subgraph,cost_model=None,stats=None):
     """
     Given a path, generate the dependency graph
     :param graph:
     :param path:
     :param dep_graph:
-    :return:  a tuple of a frozenset of nodes and a frozenset of edges.  This is the graph that has been run and
-    filtered, and is also a key in the dep graph that the next path should use as its dependency
+    :param cost_model: decides where along the path the two walks meet.  Without one, they meet in the middle.
+
+    The path only waits on the joins it needs: the heads (joins that nothing has been joined onto yet, kept in
+    traversed_subgraph['heads']) that cover the unbound nodes it shares with what has been traversed.  Each end is
+    walked from the head covering it, or from the start of the plan if it is bound or new, and the path's join
+    joins it with all the heads it needed.  So paths through separate parts of the graph run side by side.
     """
-    #First thing we need to do is to zing along the path until we get to a a part that we haven't previously traversed
+    path = trim_path(graph, path, traversed_subgraph)
+    if path is None:
+        #It sometimes happens that we want to traverse a path, but we've already got all those edges
+        count(stats, 'paths_skipped')
+        return
+    count(stats, 'paths_processed')
+    #Now we have an actual path to traverse
+    root = (frozenset(), frozenset())
+    heads = traversed_subgraph.setdefault('heads', [])
+    shared = [ node for node in path if node in traversed_subgraph['nodes'] and not graph.nodes[node]['bound'] ]
+    needed = [ head for head in heads if any(node in head[0] for node in shared) ]
+    def head_of(node):
+        return next((head for head in needed if node in head[0]), root)
+    path_edges = [ edge_id for u,v in zip(path, path[1:]) for edge_id in get_edge_ids(graph.get_edge_data(u,v)) ]
+    #update traversed subgraph for next time before we start whacking on path
+    traversed_subgraph['nodes'].update(path)
+    meet = split_path(graph, path, cost_model)
+    front = path[:meet+1]
+    back = path[meet:][::-1]
+    #Now add from each end, starting from whatever has the final say on the ids of the node at that end
+    startedge = head_of(front[0])
+    endedge = head_of(back[0])
+    for i in range(max(len(front),len(back))-1):
+        if i < len(front)-1:
+            startedge = dep_graph.add_dependency(graph,front[i],front[i+1],startedge,traversed_subgraph)
+        if i < len(back)-1:
+            endedge = dep_graph.add_dependency(graph,back[i],back[i+1],endedge,traversed_subgraph)
+    end = join_heads(needed, path, path_edges)
+    #Now add a join node.  The heads that neither walk started from (they cover nodes in the middle of the path)
+    # feed into it directly
+    walked_from = set()
+    if len(front) > 1:
+        walked_from.add(head_of(front[0]))
+    if len(back) > 1:
+        walked_from.add(head_of(back[0]))
+    upstream = [ tail for tail in (startedge, endedge) if tail != root ]
+    upstream += [ head for head in needed if head not in walked_from ]
+    for x in dict.fromkeys(upstream):
+        dep_graph.add_simple_dependency(x, end)
+    set_heads(traversed_subgraph, [ head for head in heads if head not in needed ] + [end])
+    count(stats, 'joins')
+
+def join_heads(heads, nodes=(), edges=()):
+    """A join of the heads, plus the given nodes and edges.  Its parent is the last of the heads."""
+    all_nodes = frozenset(nodes).union(*(head[0] for head in heads))
+    all_edges = frozenset(edges).union(*(head[1] for head in heads))
+    if not heads:
+        return JoinEvent(None, all_nodes, all_edges)
+    parent = heads[-1]
+    return JoinEvent(parent, all_nodes - parent.nodes, all_edges - parent.edges, all_nodes, all_edges)
+
+def set_heads(traversed_subgraph, heads):
+    """When there's a single head, it's the join of everything traversed, for freeze_subgraph"""
+    traversed_subgraph['heads'] = heads
+    if len(heads) == 1:
+        traversed_subgraph['join'] = heads[0]
+    else:
+        traversed_subgraph.pop('join', None)
+
+def merge_heads(dep_graph, traversed_subgraph, stats=None):
+    """If paths have left more than one head, join them, so that the plan comes together in a single join"""
+    heads = traversed_subgraph.get('heads', [])
+    if len(heads) < 2:
+        return
+    join = join_heads(heads)
+    for head in heads:
+        dep_graph.add_simple_dependency(head, join)
+    set_heads(traversed_subgraph, [join])
+    count(stats, 'joins')
+
+def trim_path(graph, path, traversed_subgraph):
+    """Zing along the path from either end until we get to a part that we haven't previously traversed.
+    Returns None if there's nothing left."""
     try:
         i = 0
         while graph.get_edge_data(path[i], path[i+1])['edge_id'] in traversed_subgraph['edges']:
@@ -170,68 +487,115 @@ def process_path(graph,path,dep_graph,traversed_subgraph):
         if i < -1:
             path = path[:i+1]
     except IndexError:
-        #It sometimes happens that we want to traverse a path, but we've already got all those edges
-        return
-    #Now we have an actual path to traverse
-    last = freeze_subgraph(traversed_subgraph)
-    #update traversed subgraph for next time before we start whacking on path
-    traversed_subgraph['nodes'].update(path)
-    #Now add one from each end using the most recent join as the starting dependency
-    startedge = dep_graph.add_dependency(graph, path[0], path[1], last, traversed_subgraph)
-    endedge = dep_graph.add_dependency(graph, path[-1], path[-2], last, traversed_subgraph)
-    path = path[1:-1]
-    #Now add from each end using the node as the starting dependency
-    while len(path) > 2:
-        #Front
-        startedge = dep_graph.add_dependency(graph,path[0],path[1],startedge,traversed_subgraph)
-        #Back
-        endedge = dep_graph.add_dependency(graph,path[-1],path[-2],endedge,traversed_subgraph)
-        #cycle down
-        path = path[1:-1]
-    #Now path will either be 1 or 2 nodes long.
-    if len(path) == 2:
-        startedge = dep_graph.add_dependency(graph,path[1],path[0],startedge,traversed_subgraph)
-    end = freeze_subgraph(traversed_subgraph)
-    #Now add a join node.   This will also be used as the starting key for the next path
-    dep_graph.add_simple_dependency(startedge, end)
-    dep_graph.add_simple_dependency(endedge, end)
+        return None
+    return path
+
+def split_path(graph, path, cost_model=None):
+    """Choose the node where the walks in from the two ends of the path meet, as an index into the path.
+    By default this is the middle, with the front walk taking the extra edge on odd paths.  With a cost model,
+    it's the node that gives the smallest estimated total of intermediate results, preferring the middle on ties.
+    That can mean walking the whole way from one end."""
+    middle = len(path) // 2
+    if cost_model is None:
+        return middle
+    costs = split_costs(graph, path, cost_model)
+    return min(range(len(path)), key=lambda meet: (costs[meet], abs(meet - middle)))
+
+def split_costs(graph, path, cost_model):
+    """The estimated cost of meeting at each node of the path"""
+    hops = [ get_edge_ids(graph.get_edge_data(u,v)) for u,v in zip(path, path[1:]) ]
+    front = cost_model.walk_costs(path[0], hops)
+    back = cost_model.walk_costs(path[-1], hops[::-1])
+    return [ f + b for f,b in zip(front, reversed(back)) ]
+
+def path_cost(graph, path, cost_model):
+    if path is None:
+        return 0
+    return min(split_costs(graph, path, cost_model))
 
 def freeze_subgraph(subgraph):
+    """The join of the subgraph traversed so far.  That's the last one made by join_subgraph, or if there isn't
+    one, the subgraph as a tuple, which is the start of the plan if nothing has been traversed."""
+    if 'join' in subgraph:
+        return subgraph['join']
     return (frozenset(subgraph['nodes']), frozenset(subgraph['edges']))
 
-def get_paths(g):
-    bound_nodes = get_bound_nodes(g)
-    paths = []
-    for si,s in enumerate(bound_nodes):
-        for t in bound_nodes[si+1:]:
-            paths += nx.all_simple_paths(g,s,t)
-    return paths
+def join_subgraph(subgraph, new_nodes, new_edges):
+    """Make the next join of the traversed subgraph, which new_nodes and new_edges have just been added to"""
+    parent = subgraph.get('join')
+    if parent is None:
+        new_nodes, new_edges = subgraph['nodes'], subgraph['edges']
+    subgraph['join'] = JoinEvent(parent, new_nodes, new_edges, subgraph['nodes'], subgraph['edges'])
+    return subgraph['join']
+
+def candidate_paths(g, max_length=None, stats=None, deadline=None):
+    """Lazily generate the simple paths between bound nodes and the cycles through bound nodes, shortest first.
+    Paths of equal length come out in a fixed order (the paths between each pair of bound nodes, then the cycles
+    through each bound node; see by_length), without listing all of them first.
+    Nothing more is generated once the deadline has passed."""
+    paths = path_generators(g)
+    cycles = cycle_generators(g)
+    if deadline is not None:
+        paths = [ until(deadline, generator) for generator in paths ]
+        cycles = [ until(deadline, generator) for generator in cycles ]
+    if stats is not None:
+        paths = [ stats.timed('get_paths', generator, 'paths_found') for generator in paths ]
+        cycles = [ stats.timed('get_cycles', generator, 'cycles_found') for generator in cycles ]
+    return by_length(paths + cycles, max_length)
+
+def until(deadline, paths):
+    """Pass paths along until the deadline, without starting on another one after it"""
+    paths = iter(paths)
+    while time.monotonic() <= deadline:
+        path = next(paths, None)
+        if path is None:
+            return
+        yield path
+
+def by_length(generators, max_length=None):
+    """Merge generators that each produce paths in order of increasing length.  Paths of the same length come out
+    in the order of their generators, so only the next path from each generator is held, and a generator is only
+    asked for another path once its last one has been taken.  Nothing longer than max_length edges is produced."""
+    for path in heapq.merge(*generators, key=len):
+        if max_length is not None and len(path) - 1 > max_length:
+            return
+        yield path
 
-def get_cycles(g):
+def path_generators(g):
     bound_nodes = get_bound_nodes(g)
-    cycles = nx.simple_cycles(g.to_directed())
-    interim_cycles=[]
-    for cycle in cycles:
-        if len(cycle) < 3:
-            continue
-        for bn in bound_nodes:
-            if bn in cycle:
-                interim_cycles.append(format_cycle(cycle,bn))
-                break
-    #this gets us cycles in both directions.  We want to chuck that.
-    uniquer = set()
-    return_cycles = []
-    for cycle in interim_cycles:
-        s = frozenset(cycle)
-        if s in uniquer:
-            continue
-        return_cycles.append(cycle)
-        uniquer.add(s)
-    return return_cycles
+    return [ shortest_simple_paths(g,s,t) for si,s in enumerate(bound_nodes) for t in bound_nodes[si+1:] ]
 
-def format_cycle(cycle,bn):
+def shortest_simple_paths(g, source, target, ignore_nodes=()):
+    return graphs.shortest_simple_paths(g, source, target, ignore_nodes)
+
+def get_paths(g):
+    return list(by_length(path_generators(g)))
+
+def get_cycles(g, max_length=None):
+    return list(iter_cycles(g, max_length))
+
+def iter_cycles(g, max_length=None):
     """
-    I want the format of the cycles to be something like [A B C A] where A is the bound node.
+    Lazily generate the undirected cycles that pass through a bound node, shortest first.
+    Each cycle comes out once, formatted like [A B C A] where A is the first bound node (in graph order) on it,
+    and the second node is the larger of A's two neighbors on the cycle.
     """
-    loc = cycle.index(bn)
-    return cycle[loc:] + cycle[:loc+1]
+    return by_length(cycle_generators(g), max_length)
+
+def cycle_generators(g):
+    """A cycle through bound node A leaves A by one neighbor and comes back by another, so for every pair of A's
+    neighbors, the paths between them that avoid A close a cycle.  Cycles through an earlier bound node have been
+    found from that node already, so those are blocked off too."""
+    bound_nodes = get_bound_nodes(g)
+    generators = []
+    for bi,bn in enumerate(bound_nodes):
+        blocked = set(bound_nodes[:bi+1])
+        neighbors = sorted(n for n in g.neighbors(bn) if n not in blocked)
+        for ni,last in enumerate(neighbors):
+            for first in neighbors[ni+1:]:
+                generators.append(anchored_cycles(g, bn, first, last, blocked))
+    return generators
+
+def anchored_cycles(g, anchor, first, last, blocked):
+    for path in shortest_simple_paths(g, first, last, blocked):
+        yield [anchor] + path + [anchor]
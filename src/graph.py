@@ -0,0 +1,321 @@
+"""
+A small undirected graph, and the handful of graph algorithms that the planner needs.
+
+Graph implements just enough of the networkx.Graph interface for query_graph.py and generate_plan.py, so that
+planning doesn't have to import networkx.  The algorithms here only use that shared interface (adj, nodes, iteration),
+so they work on networkx graphs as well.
+"""
+import hashlib
+from collections import deque
+from heapq import heappush, heappop
+
+class Graph:
+    def __init__(self):
+        #node -> attributes, and node -> neighbor -> edge attributes.  Both directions share one attribute dict
+        self._node = {}
+        self._adj = {}
+    @property
+    def adj(self):
+        return self._adj
+    @property
+    def nodes(self):
+        return NodeView(self._node)
+    @property
+    def edges(self):
+        return EdgeView(self._adj)
+    @property
+    def degree(self):
+        return DegreeView(self._adj)
+    def __iter__(self):
+        return iter(self._node)
+    def __contains__(self, node):
+        return node in self._node
+    def __len__(self):
+        return len(self._node)
+    def add_node(self, node, **attr):
+        if node not in self._node:
+            self._node[node] = attr
+            self._adj[node] = {}
+        else:
+            self._node[node].update(attr)
+    def add_edge(self, u, v, **attr):
+        for node in (u, v):
+            if node not in self._node:
+                self.add_node(node)
+        edge_data = self._adj[u].get(v, {})
+        edge_data.update(attr)
+        self._adj[u][v] = edge_data
+        self._adj[v][u] = edge_data
+    def has_edge(self, u, v):
+        return u in self._adj and v in self._adj[u]
+    def get_edge_data(self, u, v, default=None):
+        try:
+            return self._adj[u][v]
+        except KeyError:
+            return default
+    def neighbors(self, node):
+        return iter(self._adj[node])
+    def remove_edge(self, u, v):
+        del self._adj[u][v]
+        if u != v:
+            del self._adj[v][u]
+    def remove_node(self, node):
+        for neighbor in self._adj[node]:
+            if neighbor != node:
+                del self._adj[neighbor][node]
+        del self._adj[node]
+        del self._node[node]
+    def remove_nodes_from(self, nodes):
+        for node in nodes:
+            if node in self._node:
+                self.remove_node(node)
+    def number_of_nodes(self):
+        return len(self._node)
+    def number_of_edges(self):
+        return sum(len(nbrs) + (node in nbrs) for node, nbrs in self._adj.items()) // 2
+    def copy(self):
+        return self.subgraph(self._node)
+    def subgraph(self, nodes):
+        """An independent copy of the subgraph induced by nodes, in this graph's node order"""
+        nodes = set(nodes)
+        graph = Graph()
+        for node, attr in self._node.items():
+            if node in nodes:
+                graph._node[node] = dict(attr)
+                graph._adj[node] = {}
+        copied = {}
+        for u in graph._adj:
+            for v, edge_data in self._adj[u].items():
+                if v in nodes:
+                    key = (u, v) if (v, u) not in copied else (v, u)
+                    if key not in copied:
+                        copied[key] = dict(edge_data)
+                    graph._adj[u][v] = copied[key]
+        return graph
+
+class NodeView:
+    def __init__(self, nodes):
+        self._nodes = nodes
+    def __call__(self, data=False):
+        if data:
+            return self._nodes.items()
+        return self
+    def __getitem__(self, node):
+        return self._nodes[node]
+    def __iter__(self):
+        return iter(self._nodes)
+    def __contains__(self, node):
+        return node in self._nodes
+    def __len__(self):
+        return len(self._nodes)
+
+class EdgeView:
+    def __init__(self, adj):
+        self._adj = adj
+    def __call__(self, nbunch=None, data=False):
+        return list(self._edges(nbunch, data))
+    def _edges(self, nbunch=None, data=False):
+        seen = set()
+        nodes = self._adj if nbunch is None else ([nbunch] if nbunch in self._adj else nbunch)
+        for u in nodes:
+            for v, edge_data in self._adj[u].items():
+                if v not in seen:
+                    yield (u, v, edge_data) if data else (u, v)
+            seen.add(u)
+    def __getitem__(self, edge):
+        u, v = edge
+        return self._adj[u][v]
+    def __iter__(self):
+        return self._edges()
+    def __len__(self):
+        return sum(1 for _ in self._edges())
+
+class DegreeView:
+    def __init__(self, adj):
+        self._adj = adj
+    def __getitem__(self, node):
+        nbrs = self._adj[node]
+        return len(nbrs) + (node in nbrs)
+    def __call__(self, node):
+        return self[node]
+
+def connected_components(graph):
+    """Generate the sets of nodes in each connected component, in order of their first node"""
+    adj = graph.adj
+    seen = set()
+    for node in graph:
+        if node in seen:
+            continue
+        component = {node}
+        frontier = [node]
+        while frontier:
+            for neighbor in adj[frontier.pop()]:
+                if neighbor not in component:
+                    component.add(neighbor)
+                    frontier.append(neighbor)
+        seen.update(component)
+        yield component
+
+def is_connected(graph):
+    if len(graph) == 0:
+        raise ValueError('Connectivity is undefined for the null graph')
+    return len(next(connected_components(graph))) == len(graph)
+
+def shortest_path(adj, source, target, ignore_nodes=(), ignore_edges=()):
+    """A shortest path from source to target by breadth first search, avoiding the given nodes and edges (as
+    (u,v) pairs, in either direction).  Returns None if there isn't one."""
+    if source in ignore_nodes or target in ignore_nodes:
+        return None
+    parents = {source: None}
+    frontier = deque([source])
+    while frontier:
+        node = frontier.popleft()
+        if node == target:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parents[node]
+            return path[::-1]
+        for neighbor in adj[node]:
+            if neighbor in parents or neighbor in ignore_nodes:
+                continue
+            if ignore_edges and ((node, neighbor) in ignore_edges or (neighbor, node) in ignore_edges):
+                continue
+            parents[neighbor] = node
+            frontier.append(neighbor)
+    return None
+
+def shortest_simple_paths(graph, source, target, ignore_nodes=()):
+    """
+    Generate the simple paths from source to target, shortest first, avoiding ignore_nodes.
+    This is Yen's algorithm: each new path is the shortest deviation ("spur") from some prefix of an earlier one.
+    The paths found so far are kept in a trie, so the edges that earlier paths took out of each prefix are found
+    without going through all of them.
+    """
+    adj = graph.adj
+    #node -> the same for the rest of the paths that go through it
+    accepted = {}
+    candidates = PathBuffer()
+    path = shortest_path(adj, source, target, ignore_nodes)
+    if path is None:
+        return
+    candidates.push(path)
+    while candidates:
+        path = candidates.pop()
+        yield path
+        level = accepted
+        for node in path:
+            level = level.setdefault(node, {})
+        blocked = set(ignore_nodes)
+        level = accepted
+        for i in range(1, len(path)):
+            root = path[:i]
+            level = level[root[-1]]
+            blocked_edges = set( (root[-1], node) for node in level )
+            spur = shortest_path(adj, root[-1], target, blocked, blocked_edges)
+            if spur is not None:
+                candidates.push(root[:-1] + spur)
+            blocked.add(root[-1])
+
+class PathBuffer:
+    """A priority queue of paths by length, that ignores paths it has already seen"""
+    def __init__(self):
+        self.seen = set()
+        self.queue = []
+        self.counter = 0
+    def __len__(self):
+        return len(self.queue)
+    def push(self, path):
+        key = tuple(path)
+        if key not in self.seen:
+            self.seen.add(key)
+            heappush(self.queue, (len(path), self.counter, path))
+            self.counter += 1
+    def pop(self):
+        return heappop(self.queue)[2]
+
+def refine_colors(graph, node_color, edge_color):
+    """
+    Color refinement (1-dimensional Weisfeiler-Lehman).  Starting from node_color(graph, node), each round recolors every
+    node by its color plus the multiset of (edge_color, neighbor color) around it, until the partition stops
+    changing.  Colors are numbered in order of their signatures, so they don't depend on how nodes are named.
+    Returns node -> color, and the list of signatures from every round, which identifies the result.
+    """
+    adj = graph.adj
+    colors = { node: node_color(graph, node) for node in graph }
+    history = []
+    while True:
+        signatures = { node: (colors[node], tuple(sorted( (edge_color(adj[node][nbr]), colors[nbr]) for nbr in adj[node] )))
+                       for node in graph }
+        palette = { signature: i for i, signature in enumerate(sorted(set(signatures.values()))) }
+        history.append(sorted(palette))
+        new_colors = { node: palette[signatures[node]] for node in graph }
+        if len(palette) == len(set(colors.values())):
+            return new_colors, history
+        colors = new_colors
+
+def graph_hash(graph, node_color, edge_color):
+    """A hash of the graph that is the same for isomorphic graphs, and stable from one process to the next"""
+    colors, history = refine_colors(graph, node_color, edge_color)
+    return hashlib.sha1(repr(history).encode('utf8')).hexdigest()
+
+def find_isomorphism(g1, g2, node_color, edge_color):
+    """
+    Find a mapping from the nodes of g1 to the nodes of g2 that preserves the edges and the node and edge colors.
+    Returns None if there isn't one.  The search only tries nodes of the same refined color, and goes in breadth
+    first order, so it's quick for the sort of graphs that show up in queries.
+    """
+    if len(g1) != len(g2) or g1.number_of_edges() != g2.number_of_edges():
+        return None
+    colors1, history1 = refine_colors(g1, node_color, edge_color)
+    colors2, history2 = refine_colors(g2, node_color, edge_color)
+    if history1 != history2:
+        return None
+    by_color = {}
+    for node, color in colors2.items():
+        by_color.setdefault(color, []).append(node)
+    order = [ node for component in connected_components(g1) for node in bfs_order(g1, component) ]
+    adj1, adj2 = g1.adj, g2.adj
+    mapping = {}
+    used = set()
+    def consistent(u, v):
+        for nbr, edge_data in adj1[u].items():
+            if nbr in mapping:
+                other = adj2[v].get(mapping[nbr])
+                if other is None or edge_color(other) != edge_color(edge_data):
+                    return False
+        return True
+    #Backtracking, with a stack of the candidates left to try at each depth
+    candidates = [None] * len(order)
+    i = 0
+    while i < len(order):
+        u = order[i]
+        if candidates[i] is None:
+            candidates[i] = iter(by_color.get(colors1[u], ()))
+        if u in mapping:
+            used.discard(mapping.pop(u))
+        for v in candidates[i]:
+            if v not in used and consistent(u, v):
+                mapping[u] = v
+                used.add(v)
+                i += 1
+                break
+        else:
+            candidates[i] = None
+            i -= 1
+            if i < 0:
+                return None
+    return mapping
+
+def bfs_order(graph, nodes):
+    nodes = [ node for node in graph if node in nodes ]
+    order = [nodes[0]]
+    seen = {nodes[0]}
+    i = 0
+    while i < len(order):
+        for neighbor in graph.adj[order[i]]:
+            if neighbor not in seen:
+                seen.add(neighbor)
+                order.append(neighbor)
+        i += 1
+    return order
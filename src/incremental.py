@@ -0,0 +1,98 @@
+"""
+Replanning a query graph after a small edit.
+
+Most edits (binding a node, adding or removing an edge or a hair) only touch one of the components that decompose
+splits a query graph into, and often only the hair on it.  IncrementalPlanner remembers the plan for each
+component, and for each component's bald core, and only replans the ones that changed.
+"""
+from .query_graph import convert_to_graph, get_edge_ids
+from .generate_plan import decompose, dehair, generate_simple_plan
+from .plan_stats import stage, count
+
+class IncrementalPlanner:
+    """
+    Plans a TRAPI query graph, and replans it after each edit given to apply().
+
+    The plans are the same as generate_plan's.  A component or bald core is reused only if it is exactly the same
+    as before, down to the order of its nodes and edges, since that order can change how ties are broken.
+    If a PlanStats is given, components_reused and cores_reused count what was saved.
+    """
+    def __init__(self, trapi_query_graph, max_paths=None, max_path_length=None, stats=None):
+        self.query_graph = { 'nodes': dict(trapi_query_graph['nodes']), 'edges': dict(trapi_query_graph['edges']) }
+        self.max_paths = max_paths
+        self.max_path_length = max_path_length
+        self.stats = stats
+        #graph_key -> (plan, bald core key) for the components of the current query graph, and graph_key -> plan for
+        # their bald cores
+        self.component_plans = {}
+        self.core_plans = {}
+        self.plans = self.replan()
+    def apply(self, diff):
+        """
+        Edit the query graph and return the new plans.  diff is a dict that can have any of
+            add_nodes: node id -> TRAPI node
+            update_nodes: node id -> TRAPI node, replacing the old one; this is how a node becomes bound or unbound
+            remove_nodes: node ids.  Their edges are removed too.
+            add_edges: edge id -> TRAPI edge
+            remove_edges: edge ids
+        """
+        nodes, edges = self.query_graph['nodes'], self.query_graph['edges']
+        removed = set(diff.get('remove_nodes', ()))
+        for node in removed:
+            del nodes[node]
+        for edge in diff.get('remove_edges', ()):
+            del edges[edge]
+        for edge, props in list(edges.items()):
+            if props['subject'] in removed or props['object'] in removed:
+                del edges[edge]
+        for node, props in diff.get('update_nodes', {}).items():
+            if node not in nodes:
+                raise KeyError(f'No node {node} to update')
+            nodes[node] = props
+        nodes.update(diff.get('add_nodes', {}))
+        edges.update(diff.get('add_edges', {}))
+        self.plans = self.replan()
+        return self.plans
+    def replan(self):
+        stats = self.stats
+        with stage(stats, 'replan'):
+            graph = convert_to_graph(self.query_graph)
+            with stage(stats, 'decompose'):
+                double_pins, components = decompose(graph)
+            plans = double_pins
+            component_plans = {}
+            core_plans = {}
+            for component in components:
+                key = graph_key(component)
+                if key in self.component_plans:
+                    count(stats, 'components_reused')
+                    plan, core_key = self.component_plans[key]
+                    core_plans[core_key] = self.core_plans[core_key]
+                else:
+                    plan, core_key = self.plan_component(component, core_plans)
+                component_plans[key] = (plan, core_key)
+                #The caller gets a copy, so that we can keep ours
+                plans.append(plan.relabel())
+            self.component_plans = component_plans
+            self.core_plans = core_plans
+        return plans
+    def plan_component(self, component, core_plans):
+        """generate_component_plan, reusing the plan for the bald core if it's unchanged.  Returns the plan and the
+        core's key."""
+        with stage(self.stats, 'dehair'):
+            hairs, bald_head = dehair(component)
+        key = graph_key(bald_head)
+        core = self.core_plans.get(key)
+        if core is None:
+            core, traversed = generate_simple_plan(bald_head, self.max_paths, self.max_path_length, stats=self.stats)
+        else:
+            count(self.stats, 'cores_reused')
+        core_plans[key] = core
+        plan = core.relabel()
+        plan.add_hairs(hairs)
+        return plan, key
+
+def graph_key(graph):
+    """Everything about a graph that the planner looks at, in order"""
+    return (tuple( (node, data['bound']) for node, data in graph.nodes(data=True) ),
+            tuple( (u, v, tuple(get_edge_ids(edge_data))) for u, v, edge_data in graph.edges(data=True) ))
@@ -0,0 +1,158 @@
+"""
+Columnar joins, for running the join events of a plan.
+
+A join means: intersect the partial results of everything upstream of it on the query nodes they share.  Here,
+partial results are ResultTables, with a column of ids per query node (and, if wanted, per query edge), where the ids
+are CURIEs interned to ints by an Interner.  Joins are done on whole columns with numpy, by sort-merge or by hashing.
+
+numpy is only needed for this module, so it isn't a requirement of the planner.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def require_numpy():
+    if np is None:
+        raise ImportError('The columnar join engine needs numpy.  Install it with: pip install numpy')
+
+class Interner:
+    """Numbers CURIEs (or any other hashable ids) from 0, so that tables can hold them as ints"""
+    def __init__(self):
+        require_numpy()
+        self.ids = {}
+        self.curies = []
+    def __len__(self):
+        return len(self.curies)
+    def intern(self, curie):
+        i = self.ids.get(curie)
+        if i is None:
+            i = self.ids[curie] = len(self.curies)
+            self.curies.append(curie)
+        return i
+    def intern_all(self, curies):
+        curies = list(curies)
+        return np.fromiter(map(self.intern, curies), dtype=np.int64, count=len(curies))
+    def lookup(self, ids):
+        return [ self.curies[i] for i in ids ]
+
+class ResultTable:
+    """
+    Partial results: a dict from column names (query node ids, or query edge ids) to equal length int arrays.
+    Each row is one way of binding those nodes and edges.
+    """
+    def __init__(self, columns):
+        require_numpy()
+        self.columns = { name: np.asarray(column, dtype=np.int64) for name, column in columns.items() }
+        lengths = set(map(len, self.columns.values()))
+        if len(lengths) > 1:
+            raise ValueError(f'Columns of different lengths: {sorted(lengths)}')
+        self.length = lengths.pop() if lengths else 0
+    def __len__(self):
+        return self.length
+    @classmethod
+    def from_rows(cls, rows, interner, names=None):
+        """rows are dicts from column names to CURIEs"""
+        rows = list(rows)
+        if names is None:
+            names = list(rows[0]) if rows else []
+        return cls({ name: interner.intern_all(row[name] for row in rows) for name in names })
+    def to_rows(self, interner):
+        names = list(self.columns)
+        columns = [ interner.lookup(self.columns[name]) for name in names ]
+        return [ dict(zip(names, values)) for values in zip(*columns) ]
+    def select(self, names):
+        return ResultTable({ name: self.columns[name] for name in names })
+    def take(self, rows):
+        return ResultTable({ name: column[rows] for name, column in self.columns.items() })
+
+def join_tables(left, right, on=None, method='sort'):
+    """
+    Inner join two ResultTables on the columns in on (by default, every column they share).  With nothing to
+    join on, this is the cartesian product.  method is 'sort' for a sort-merge join or 'hash' for a hash join.
+    The result has all of left's columns, then the rest of right's, with rows in left's order.
+    """
+    if on is None:
+        on = [ name for name in left.columns if name in right.columns ]
+    if on:
+        left_key, right_key = key_columns(left, right, on)
+        if method == 'hash':
+            left_rows, right_rows = hash_join(left_key, right_key)
+        elif method == 'sort':
+            left_rows, right_rows = merge_join(left_key, right_key)
+        else:
+            raise ValueError(f'Unknown join method {method}')
+    else:
+        left_rows = np.repeat(np.arange(len(left)), len(right))
+        right_rows = np.tile(np.arange(len(right)), len(left))
+    columns = { name: column[left_rows] for name, column in left.columns.items() }
+    for name, column in right.columns.items():
+        if name not in columns:
+            columns[name] = column[right_rows]
+    return ResultTable(columns)
+
+def key_columns(left, right, on):
+    """Combine the columns to join on into a single key per row, numbered 0 up, the same way on both sides"""
+    key = None
+    for name in on:
+        values, codes = np.unique(np.concatenate([left.columns[name], right.columns[name]]), return_inverse=True)
+        codes = codes.reshape(-1)
+        if key is None:
+            key = codes
+        else:
+            #Renumber, so that the keys stay small however many columns there are
+            values, key = np.unique(key * len(values) + codes, return_inverse=True)
+            key = key.reshape(-1)
+    return key[:len(left)], key[len(left):]
+
+def merge_join(left_key, right_key):
+    """The row numbers of the matching pairs: sort the right side, and find each left key's run in it"""
+    order = np.argsort(right_key, kind='stable')
+    sorted_key = right_key[order]
+    starts = np.searchsorted(sorted_key, left_key, side='left')
+    counts = np.searchsorted(sorted_key, left_key, side='right') - starts
+    return expand_matches(order, starts, counts)
+
+def hash_join(left_key, right_key):
+    """The row numbers of the matching pairs.  The keys are already small ints, so they can index the buckets
+    directly."""
+    buckets = np.bincount(right_key, minlength=max(int(left_key.max(initial=-1)), int(right_key.max(initial=-1))) + 1)
+    bucket_starts = np.cumsum(buckets) - buckets
+    order = np.argsort(right_key, kind='stable')
+    return expand_matches(order, bucket_starts[left_key], buckets[left_key])
+
+def expand_matches(order, starts, counts):
+    """Left row i matches the right rows order[starts[i]:starts[i]+counts[i]]"""
+    total = int(counts.sum())
+    left_rows = np.repeat(np.arange(len(counts)), counts)
+    #Where each match falls within its left row's run
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    right_rows = order[np.repeat(starts, counts) + offsets]
+    return left_rows, right_rows
+
+class ColumnarJoiner:
+    """
+    Does the joins of a plan.  Give join() a join event and the ResultTables from the events upstream of it, and
+    it joins them on the query nodes of the join that they share, keeping just the columns for the join's nodes and
+    edges.  The tables are joined smallest first, preferring tables that share a node with what has been joined so
+    far, so that cartesian products are left until last.
+    """
+    def __init__(self, plan, method='sort'):
+        require_numpy()
+        self.plan = plan
+        self.method = method
+    def join(self, event, tables):
+        """tables holds the results of each of event's prevs, in the same order as plan.get_prev(event)"""
+        prevs = self.plan.get_prev(event)
+        if len(tables) != len(prevs):
+            raise ValueError(f'The join has {len(prevs)} upstream events but got {len(tables)} tables')
+        nodes, edges = event
+        pending = sorted(tables, key=len)
+        result = pending.pop(0)
+        while pending:
+            sharing = [ table for table in pending if any(name in nodes and name in result.columns for name in table.columns) ]
+            table = (sharing or pending)[0]
+            pending.remove(table)
+            on = [ name for name in result.columns if name in nodes and name in table.columns ]
+            result = join_tables(result, table, on, self.method)
+        return result.select([ name for name in result.columns if name in nodes or name in edges ])
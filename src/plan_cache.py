@@ -0,0 +1,188 @@
+import json
+import os
+import sqlite3
+import struct
+import time
+from collections import OrderedDict
+
+from .query_graph import get_edge_ids
+from .graph import Graph, graph_hash, find_isomorphism
+from .QueryPlan import QueryPlan
+
+class PlanCache:
+    """
+    An LRU cache of query plans, keyed by the shape of the query graph.
+
+    Two query graphs have the same shape if they are isomorphic once everything but the structure and the bound
+    flags is thrown away; ids, predicates and categories don't matter to the planner.  The shapes are bucketed by
+    a hash of their color refinement (Weisfeiler-Lehman), and a hit is confirmed by finding the isomorphism, which
+    is then used to rename the cached plans' nodes and edges to those of the new query graph.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        #hash -> list of (template graph, plans)
+        self.entries = OrderedDict()
+    def __len__(self):
+        return len(self.entries)
+    def get(self, graph, options=()):
+        """Return plans for graph, or None if this shape hasn't been seen.  options should hold anything else
+        that the plans depend on."""
+        key = (shape_hash(graph), options)
+        for template, plans in self.entries.get(key, []):
+            maps = shape_maps(template, graph)
+            if maps is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return [ plan.relabel(*maps) for plan in plans ]
+        self.misses += 1
+        return None
+    def put(self, graph, plans, options=()):
+        key = (shape_hash(graph), options)
+        #Hang on to a copy; the caller owns the plans
+        self.entries.setdefault(key, []).append( (graph.copy(), [plan.relabel() for plan in plans]) )
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+class DiskPlanCache:
+    """
+    A plan cache in an SQLite database, which survives restarts and can be shared by all of the processes on a host.
+    It works like PlanCache: plans are stored (serialized with QueryPlan.to_bytes) along with the graph they were
+    made for, keyed by its shape hash, and a hit is confirmed by isomorphism and renamed to fit.
+    The database is in WAL mode, so readers don't block each other or the writer.  Once the stored plans add up to
+    more than max_bytes, the least recently used are evicted.  So that a hit is usually just a read, a plan's
+    last use is only recorded when the last record of it is more than touch_after seconds old; the LRU order is
+    only that accurate.
+    """
+    def __init__(self, path, max_bytes=64 * 2**20, timeout=30, touch_after=60):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_after = touch_after
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._pid = None
+        db = self.connect()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('CREATE TABLE IF NOT EXISTS plans (id INTEGER PRIMARY KEY, shape TEXT, options TEXT, '
+                       'template TEXT, plans BLOB, size INTEGER, last_used REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS plans_shape ON plans (shape, options)')
+            db.execute('CREATE INDEX IF NOT EXISTS plans_last_used ON plans (last_used)')
+    def connect(self):
+        """This process's connection.  A connection can't be shared with a forked child, so it gets its own."""
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._pid = os.getpid()
+        return self._db
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_db'] = state['_pid'] = None
+        return state
+    def __len__(self):
+        return self.connect().execute('SELECT COUNT(*) FROM plans').fetchone()[0]
+    def get(self, graph, options=()):
+        db = self.connect()
+        rows = db.execute('SELECT id, template, plans, last_used FROM plans WHERE shape = ? AND options = ?',
+                          (shape_hash(graph), repr(options))).fetchall()
+        for row_id, template, plans, last_used in rows:
+            maps = shape_maps(load_template(template), graph)
+            if maps is not None:
+                self.hits += 1
+                now = time.time()
+                if now - last_used > self.touch_after:
+                    db.execute('UPDATE plans SET last_used = ? WHERE id = ?', (now, row_id))
+                return [ plan.relabel(*maps) for plan in unpack_plans(plans) ]
+        self.misses += 1
+        return None
+    def put(self, graph, plans, options=()):
+        key = (shape_hash(graph), repr(options))
+        blob = pack_plans(plans)
+        db = self.connect()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            for (template,) in db.execute('SELECT template FROM plans WHERE shape = ? AND options = ?', key).fetchall():
+                if match_shape(load_template(template), graph) is not None:
+                    #Another process got here first
+                    return
+            db.execute('INSERT INTO plans (shape, options, template, plans, size, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                       (*key, dump_template(graph), blob, len(blob), time.time()))
+            self.evict(db)
+    def evict(self, db):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM plans').fetchone()[0]
+        evicted = []
+        for row_id, size in db.execute('SELECT id, size FROM plans ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            evicted.append( (row_id,) )
+            total -= size
+        db.executemany('DELETE FROM plans WHERE id = ?', evicted)
+    def clear(self):
+        db = self.connect()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('DELETE FROM plans')
+        self.hits = self.misses = 0
+
+def dump_template(graph):
+    return json.dumps({ 'nodes': [ [node, data['bound']] for node, data in graph.nodes(data=True) ],
+                        'edges': [ [u, v, get_edge_ids(edge_data)] for u, v, edge_data in graph.edges(data=True) ] })
+
+def load_template(text):
+    data = json.loads(text)
+    graph = Graph()
+    for node, bound in data['nodes']:
+        graph.add_node(node, bound=bound)
+    for u, v, edge_ids in data['edges']:
+        if len(edge_ids) == 1:
+            graph.add_edge(u, v, edge_id=edge_ids[0])
+        else:
+            graph.add_edge(u, v, edge_id=edge_ids[0], edge_ids=edge_ids)
+    return graph
+
+def pack_plans(plans):
+    encoded = [ plan.to_bytes() for plan in plans ]
+    return struct.pack(f'<I{len(encoded)}I', len(encoded), *map(len, encoded)) + b''.join(encoded)
+
+def unpack_plans(blob):
+    count, = struct.unpack_from('<I', blob)
+    lengths = struct.unpack_from(f'<{count}I', blob, 4)
+    offset = 4 * (count + 1)
+    plans = []
+    for length in lengths:
+        plans.append(QueryPlan.from_bytes(blob[offset:offset + length]))
+        offset += length
+    return plans
+
+def shape_hash(graph):
+    return graph_hash(graph, is_bound, edge_multiplicity)
+
+def match_shape(template, graph):
+    """Find an isomorphism from template to graph that respects the bound flag and the number of parallel edges.
+    Returns the node mapping or None"""
+    return find_isomorphism(template, graph, is_bound, edge_multiplicity)
+
+def shape_maps(template, graph):
+    """If graph has the same shape as template, return the node and edge id maps that rename template's plans to
+    graph's, otherwise None"""
+    node_map = match_shape(template, graph)
+    if node_map is None:
+        return None
+    edge_map = {}
+    for u,v,edge_data in template.edges(data=True):
+        #Parallel edges are interchangeable
+        edge_map.update(zip(get_edge_ids(edge_data), get_edge_ids(graph.edges[node_map[u],node_map[v]])))
+    return node_map, edge_map
+
+def is_bound(graph, node):
+    return graph.nodes[node]['bound']
+
+def edge_multiplicity(edge_data):
+    return len(get_edge_ids(edge_data))
@@ -0,0 +1,63 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+class PlanStats:
+    """
+    Records where the planner spends its time, and how much work it does.
+
+    Pass one to generate_plan as stats=.  Afterwards, seconds holds the wall time spent in each stage (summed over
+    components), and counts holds how many of each thing were done:
+        paths_found, cycles_found: paths and cycles pulled from the (lazy) enumeration
+        paths_processed: paths that added something to the plan
+        paths_skipped: paths whose edges had all been traversed already
+        joins: join events created
+    on_stage(name, seconds) and on_count(name, n), if given, are called as the numbers come in.
+    When no PlanStats is passed, none of this is measured.
+    """
+    def __init__(self, on_stage=None, on_count=None):
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.on_stage = on_stage
+        self.on_count = on_count
+    def add_time(self, stage, seconds):
+        self.seconds[stage] += seconds
+        if self.on_stage is not None:
+            self.on_stage(stage, seconds)
+    def count(self, name, n=1):
+        self.counts[name] += n
+        if self.on_count is not None:
+            self.on_count(name, n)
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, perf_counter() - start)
+    def timed(self, stage, iterable, counter=None):
+        """Wrap an iterator so that the time spent producing its items goes to stage, and each item is counted"""
+        iterator = iter(iterable)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add_time(stage, perf_counter() - start)
+            if counter is not None:
+                self.count(counter)
+            yield item
+    def as_dict(self):
+        return {'seconds': dict(self.seconds), 'counts': dict(self.counts)}
+
+def stage(stats, name):
+    """stats.stage(name), or a no-op if there are no stats"""
+    if stats is None:
+        return nullcontext()
+    return stats.stage(name)
+
+def count(stats, name, n=1):
+    if stats is not None:
+        stats.count(name, n)
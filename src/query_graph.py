@@ -1,10 +1,27 @@
-import networkx as nx
+from .graph import Graph
 
-def convert_to_networkx(query_graph):
-    """Convert a TRAPI query graph into a networkx graph."""
-    graph = nx.Graph()
+def convert_to_graph(query_graph, graph=None):
+    """Convert a TRAPI query graph into a Graph (or fill in the empty graph given).
+    Parallel edges (several query edges between the same two nodes) become a single graph edge with all of their
+    ids in edge_ids.  edge_id is always the first of them."""
+    if graph is None:
+        graph = Graph()
     for node,node_props in query_graph['nodes'].items():
         graph.add_node(node,bound='ids' in node_props)
     for edge,edge_props in query_graph['edges'].items():
-        graph.add_edge(edge_props['subject'],edge_props['object'],edge_id=edge)
+        subject, object = edge_props['subject'], edge_props['object']
+        if graph.has_edge(subject, object):
+            edge_data = graph.edges[subject, object]
+            edge_data['edge_ids'] = get_edge_ids(edge_data) + [edge]
+        else:
+            graph.add_edge(subject,object,edge_id=edge)
     return graph
+
+def convert_to_networkx(query_graph):
+    """Convert a TRAPI query graph into a networkx graph."""
+    import networkx as nx
+    return convert_to_graph(query_graph, nx.Graph())
+
+def get_edge_ids(edge_data):
+    """All of the query edge ids on a graph edge"""
+    return edge_data.get('edge_ids') or [edge_data['edge_id']]
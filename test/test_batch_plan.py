@@ -0,0 +1,47 @@
+import pickle
+
+from bench import query_graphs
+from src.batch_plan import generate_plans, iter_plans
+from src.generate_plan import generate_plan
+from src.plan_cache import PlanCache
+from src.QueryPlan import TerminalEvent
+
+def layout(compiled):
+    events = [ ('terminal', x.name) if isinstance(x, TerminalEvent) else x for x in compiled.events ]
+    return events, list(compiled.next_offsets), list(compiled.next_targets), list(compiled.prev_targets)
+
+def renamed(trapi, suffix):
+    """The same query graph with every node and edge renamed, in the same order"""
+    return { 'nodes': { node + suffix: props for node, props in trapi['nodes'].items() },
+             'edges': { edge + suffix: {'subject': props['subject'] + suffix, 'object': props['object'] + suffix}
+                        for edge, props in trapi['edges'].items() } }
+
+def batch():
+    trapis = [ query_graphs.FAMILIES[family](4, bound) for family in ['chain', 'star', 'hairy_tree', 'cycle', 'grid', 'readme']
+               for bound in (1, 2) ]
+    return trapis + [ renamed(trapi, 'x') for trapi in trapis ] + trapis
+
+def test_same_as_generate_plan():
+    """Each shape is planned once, like going through a PlanCache"""
+    trapis = batch()
+    cache = PlanCache()
+    expected = [ [layout(p.compile()) for p in generate_plan(trapi, cache=cache)] for trapi in trapis ]
+    assert cache.misses == 8
+    for workers in (0, 2):
+        results = generate_plans(trapis, workers=workers)
+        assert [ [layout(p) for p in plans] for plans in results ] == expected
+
+def test_budget():
+    trapis = [query_graphs.grid(4, 2)]
+    results = generate_plans(trapis, workers=0, max_paths=1)
+    assert [layout(p) for p in results[0]] == [layout(p.compile()) for p in generate_plan(trapis[0], max_paths=1)]
+
+def test_unordered():
+    trapis = batch()
+    results = list(iter_plans(trapis, workers=2))
+    assert sorted(i for i, plans in results) == list(range(len(trapis)))
+    assert [i for i, plans in iter_plans(trapis, workers=2, ordered=True)] == list(range(len(trapis)))
+
+def test_picklable():
+    plans = generate_plans([query_graphs.readme(1)], workers=0)[0]
+    assert [layout(p) for p in pickle.loads(pickle.dumps(plans))] == [layout(p) for p in plans]
@@ -0,0 +1,109 @@
+import asyncio
+
+from src.batcher import ClientPool, EdgeBatcher
+from src.executor import PlanExecutor
+from src.generate_plan import generate_plan
+from src.plan_stats import PlanStats
+from test_plans import construct_trapi
+
+class StubClient:
+    """A local stand-in for a backend: each id leads to two new ids"""
+    def __init__(self, delay=0.001, fail=False):
+        self.calls = []
+        self.delay = delay
+        self.fail = fail
+        self.running = 0
+        self.most_running = 0
+    async def lookup(self, key, ids):
+        self.calls.append((key, list(ids)))
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        if self.fail:
+            raise ConnectionError(key)
+        return { i: [f'{i}.{key}.0', f'{i}.{key}.1'] for i in ids }
+
+def test_coalesce():
+    """Concurrent lookups for the same edge share one batch, and each id is only sent once"""
+    client = StubClient()
+    stats = PlanStats()
+    async def run():
+        batcher = EdgeBatcher(client, max_wait=0.01, stats=stats)
+        results = await asyncio.gather(batcher.lookup('e0', ['a', 'b']), batcher.lookup('e0', ['b', 'c', 'c']))
+        again = await batcher.lookup('e0', ['a'])
+        return results, again
+    (first, second), again = asyncio.run(run())
+    assert client.calls == [('e0', ['a', 'b', 'c'])]
+    assert first == {'a': ['a.e0.0', 'a.e0.1'], 'b': ['b.e0.0', 'b.e0.1']}
+    assert list(second) == ['b', 'c']
+    assert again == {'a': first['a']}
+    assert stats.counts['batches'] == 1
+    assert stats.counts['ids_sent'] == 3
+    assert stats.counts['ids_coalesced'] == 2
+
+def test_batch_size():
+    client = StubClient()
+    async def run():
+        batcher = EdgeBatcher(client, max_batch=1000, max_wait=0.01)
+        return await batcher.lookup('e0', range(2500))
+    results = asyncio.run(run())
+    assert len(results) == 2500
+    assert [len(ids) for key, ids in client.calls] == [1000, 1000, 500]
+
+def test_latency():
+    """A batch that doesn't fill goes out after max_wait"""
+    client = StubClient()
+    async def run():
+        batcher = EdgeBatcher(client, max_batch=1000, max_wait=0.005)
+        return await asyncio.wait_for(batcher.lookup('e0', ['a']), 1)
+    assert asyncio.run(run()) == {'a': ['a.e0.0', 'a.e0.1']}
+
+def test_shared_key():
+    """Edges that make the same request share their batches"""
+    client = StubClient()
+    async def run():
+        batcher = EdgeBatcher(client, key=lambda edge_id: edge_id.split('_')[0])
+        return await asyncio.gather(batcher.lookup('treats_1', ['a']), batcher.lookup('treats_2', ['a', 'b']))
+    first, second = asyncio.run(run())
+    assert client.calls == [('treats', ['a', 'b'])]
+    assert first['a'] == second['a']
+
+def test_failure():
+    """A failed batch fails everyone waiting on it, and the ids can be tried again"""
+    client = StubClient(fail=True)
+    async def run():
+        batcher = EdgeBatcher(client)
+        results = await asyncio.gather(batcher.lookup('e0', ['a']), batcher.lookup('e0', ['a', 'b']),
+                                       return_exceptions=True)
+        client.fail = False
+        return results, await batcher.lookup('e0', ['a'])
+    (first, second), retried = asyncio.run(run())
+    assert isinstance(first, ConnectionError) and isinstance(second, ConnectionError)
+    assert retried == {'a': ['a.e0.0', 'a.e0.1']}
+    assert len(client.calls) == 2
+
+def test_pool():
+    """The pool never has more batches out than it has clients, and never sends one client two at once"""
+    clients = [StubClient(delay=0.005) for _ in range(2)]
+    async def run():
+        batcher = EdgeBatcher(ClientPool(clients), max_batch=10)
+        await asyncio.gather(*(batcher.lookup(f'e{i}', range(25)) for i in range(4)))
+        await batcher.close()
+    asyncio.run(run())
+    assert sum(len(client.calls) for client in clients) == 12
+    assert all(client.most_running == 1 for client in clients)
+
+def test_plan():
+    """Down a bound chain, each edge is one batch of the ids that reached its input, however many there are"""
+    trapi = construct_trapi({f'n{i}': i == 0 for i in range(4)}, {f'e{i}': (f'n{i}', f'n{i+1}') for i in range(3)})
+    plans = generate_plan(trapi)
+    bound = {'n0': ['x', 'y']}
+    def prune(node, source, result):
+        if result is None:
+            return bound[node]
+        return [ i for found in result.values() for i in found ]
+    client = StubClient()
+    results = asyncio.run(PlanExecutor(plans, EdgeBatcher(client), prune=prune).run())
+    assert [ (key, len(ids)) for key, ids in client.calls ] == [('e0', 2), ('e1', 4), ('e2', 8)]
+    assert len(results[0]['e2']) == 8
@@ -0,0 +1,54 @@
+import json
+
+from bench import query_graphs
+import networkx as nx
+
+from bench import bench_planner
+from bench.bench_planner import run_case, main, STAGES
+from src.graph import Graph
+
+def test_families():
+    assert len(query_graphs.chain(5)['edges']) == 5
+    assert len(query_graphs.star(5)['edges']) == 5
+    assert len(query_graphs.hairy_tree(6, 3)['edges']) == 6
+    assert len(query_graphs.cycle(5, 2)['edges']) == 5
+    assert len(query_graphs.grid(3)['edges']) == 12
+    assert len(query_graphs.clique(5)['edges']) == 10
+    assert len(query_graphs.readme(2)['edges']) == 20
+    for family in query_graphs.FAMILIES.values():
+        trapi = family(4)
+        for edge in trapi['edges'].values():
+            assert edge['subject'] in trapi['nodes']
+            assert edge['object'] in trapi['nodes']
+
+def test_bound_count():
+    for bound in (1, 2, 3):
+        trapi = query_graphs.clique(6, bound)
+        assert sum(1 for node in trapi['nodes'].values() if 'ids' in node) == bound
+
+def test_run_case():
+    result = run_case('grid', 3, 2, repeat=1)
+    assert result['edges'] == 12
+    assert set(result['seconds']) == set(STAGES)
+    assert set(result['networkx_seconds']) == set(STAGES)
+    assert result['peak_memory_bytes'] > 0
+    assert result['depth'] >= 1 and result['width'] >= 1
+
+def test_backend(monkeypatch):
+    """The stages are timed on the graphs that generate_plan plans on, unless the networkx backend is asked for"""
+    seen = []
+    decompose = bench_planner.decompose
+    def spy(graph):
+        seen.append(type(graph))
+        return decompose(graph)
+    monkeypatch.setattr(bench_planner, 'decompose', spy)
+    trapi = query_graphs.grid(3, 2)
+    assert set(bench_planner.time_stages(trapi)) == set(STAGES)
+    bench_planner.time_stages(trapi, backend='networkx')
+    assert seen == [Graph, nx.Graph]
+
+def test_output(tmp_path):
+    output = tmp_path / 'bench.json'
+    main(['--quick', '--repeat', '1', '--output', str(output)])
+    results = json.loads(output.read_text())
+    assert len(results['results']) == len(query_graphs.QUICK_CASES)
@@ -0,0 +1,64 @@
+import random
+from itertools import product
+
+import pytest
+
+from src.combiner import CartesianProduct, ranked, top_k
+
+def test_like_product():
+    results = [['a', 'b'], [1, 2, 3], ['x', 'y']]
+    combined = CartesianProduct(results)
+    expected = list(product(*results))
+    assert len(combined) == 12
+    assert list(combined) == expected
+    assert [ combined[i] for i in range(12) ] == expected
+    assert combined[-1] == expected[-1]
+    assert combined[3:9:2] == expected[3:9:2]
+    with pytest.raises(IndexError):
+        combined[12]
+
+@pytest.mark.parametrize('offset,limit', [(0, None), (0, 5), (5, 4), (10, 10), (12, 3), (20, 1)])
+def test_page(offset, limit):
+    results = [['a', 'b'], [1, 2, 3], ['x', 'y']]
+    expected = list(product(*results))
+    stop = None if limit is None else offset + limit
+    assert list(CartesianProduct(results).page(offset, limit)) == expected[offset:stop]
+
+def test_huge():
+    """Two components of 10k results each: paging deep into the 100M combinations doesn't build them"""
+    results = [range(10000), range(10000)]
+    combined = CartesianProduct(results, combine=sum)
+    assert len(combined) == 10**8
+    page = list(combined.page(offset=55555555, limit=3))
+    assert page == [5555 + 5555, 5555 + 5556, 5555 + 5557]
+    assert combined[10**8 - 1] == 19998
+
+def test_empty():
+    assert len(CartesianProduct([['a'], []])) == 0
+    assert list(CartesianProduct([['a'], []]).page()) == []
+    assert list(ranked([['a'], []], score=len)) == []
+    assert list(CartesianProduct([])) == [()]
+
+def test_combine():
+    rows = [[{'A': 1}, {'A': 2}], [{'B': 3}]]
+    merge = lambda combination: { k: v for row in combination for k, v in row.items() }
+    assert list(CartesianProduct(rows, combine=merge)) == [{'A': 1, 'B': 3}, {'A': 2, 'B': 3}]
+
+def test_ranked():
+    """Best first, every combination exactly once"""
+    rng = random.Random(1)
+    results = [ [ (f'{p}.{i}', rng.random()) for i in range(n) ] for p, n in enumerate([5, 1, 7, 3]) ]
+    score = lambda row: row[1]
+    everything = list(ranked(results, score))
+    assert len(everything) == 5 * 7 * 3
+    assert len(set(c for s, c in everything)) == len(everything)
+    scores = [ s for s, c in everything ]
+    assert scores == sorted(scores, reverse=True)
+    brute = sorted( (sum(map(score, c)) for c in product(*results)), reverse=True )
+    assert scores == pytest.approx(brute)
+
+def test_top_k():
+    results = [range(10000), range(10000)]
+    best = top_k(results, 4, score=lambda x: -abs(x - 5000))
+    assert [ s for s, c in best ] == [0, -1, -1, -1]
+    assert best[0][1] == (5000, 5000)
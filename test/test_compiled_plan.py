@@ -0,0 +1,81 @@
+import pickle
+
+from src.generate_plan import generate_plan
+from src.QueryPlan import TerminalEvent, EDGE, JOIN, TERMINAL
+from test_plans import readme_trapi
+
+def readme_plan():
+    return generate_plan(readme_trapi())[1]
+
+def test_same_answers():
+    """The compiled plan answers the same as the plan it came from"""
+    plan = readme_plan()
+    compiled = plan.compile()
+    assert compiled.start() == plan.start()
+    assert set(compiled.end()) == set(plan.end())
+    for x in list(plan.nexts) + list(plan.prevs):
+        if isinstance(x, TerminalEvent):
+            continue
+        assert compiled.get_next(x) == plan.get_next(x)
+        assert compiled.get_prev(x) == plan.get_prev(x)
+    assert isinstance(compiled.get_next('nope'), TerminalEvent)
+
+def test_ids():
+    plan = readme_plan()
+    compiled = plan.compile()
+    assert compiled.ROOT == compiled.event_id((frozenset(), frozenset()))
+    assert [compiled.events[i] for i in compiled.start_ids] == plan.start()
+    join1 = (frozenset(['A', 'B', 'C']), frozenset(['AC', 'BC']))
+    j = compiled.event_id(join1)
+    assert compiled.kinds[j] == JOIN
+    assert compiled.in_degree[j] == 2
+    assert set(compiled.events[i] for i in compiled.prev_ids(j)) == set(['AC','BC'])
+    assert set(compiled.events[i] for i in compiled.next_ids(j)) == set(['CD'])
+    gh = compiled.event_id('GH')
+    assert compiled.kinds[gh] == EDGE
+    assert [compiled.kinds[i] for i in compiled.next_ids(gh)] == [TERMINAL]
+    assert [compiled.kinds[i] for i in compiled.end_ids] == [TERMINAL]
+
+def test_pickle():
+    compiled = readme_plan().compile()
+    loaded = pickle.loads(pickle.dumps(compiled))
+    assert loaded.start() == compiled.start()
+    assert list(loaded.next_targets) == list(compiled.next_targets)
+    assert loaded.get_next('CD') == ['DF']
+
+def test_pipelines():
+    compiled = readme_plan().compile()
+    assert set(compiled.pipelines()) == set([('AC',), ('BC',), ('CD', 'DF'), ('GI', 'FG'), ('DE',), ('EF',), ('GH',)])
+    cd = compiled.event_id('CD')
+    assert compiled.streams_from[cd] == -1
+    assert compiled.streams_from[compiled.event_id('DF')] == cd
+
+def test_relabel():
+    plan = readme_plan()
+    node_map = {'A': 'a', 'C': 'c'}
+    edge_map = {'AC': 'ac', 'GH': 'gh'}
+    compiled = plan.compile().relabel(node_map, edge_map)
+    expected = plan.relabel(node_map, edge_map).compile()
+    assert compiled.events == expected.events
+    assert compiled.next_targets == expected.next_targets
+    assert compiled.get_next('ac') == [(frozenset(['a', 'B', 'c']), frozenset(['ac', 'BC']))]
+    assert compiled.get_next('GH') is compiled.get_next('nope')
+
+def test_inputs():
+    """Each edge takes its input node's ids from the join or edge that last produced them"""
+    plan = readme_plan()
+    root = (frozenset(), frozenset())
+    join1, join2, join3 = sorted(set(plan.prevs) - set(plan.directions) - set(plan.end()), key=lambda j: j.depth)
+    assert plan.get_input('AC') == ('A', root)
+    assert plan.get_input('CD') == ('C', join1)
+    assert plan.get_input('DF') == ('D', 'CD')
+    assert plan.get_input('FG') == ('G', 'GI')
+    assert plan.get_input('EF') == ('F', join2)
+    #The hair hangs off the last join, not the start of the plan
+    assert plan.get_input('GH') == ('G', join3)
+    assert plan.get_input('nope') is None
+    compiled = plan.compile()
+    assert all(compiled.get_input(edge) == plan.get_input(edge) for edge in plan.directions)
+    relabelled = compiled.relabel({'G': 'g'}, {'GH': 'gh'})
+    assert relabelled.get_input('gh') == ('g', plan.relabel({'G': 'g'}).get_input('GH')[1])
+    assert relabelled.get_input('GH') is None
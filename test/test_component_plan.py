@@ -1,7 +1,12 @@
+import time
+
 import networkx as nx
+import pytest
 
-from src.generate_plan import generate_component_plan
+import src.generate_plan
+from src.generate_plan import generate_component_plan, bfs_plan, plan_components
 from src.QueryPlan import TerminalEvent
+from test_plans import plan_layout
 
 def test_branched_component_plan():
     """Component plan should add hair"""
@@ -20,3 +25,75 @@ def test_branched_component_plan():
     assert p.get_next(join) == ['e3']
     assert isinstance( p.get_next('e3')[0], TerminalEvent)
 
+
+def bfs_graph():
+    """A square A-B-C-D with A and C bound, and a tail C-E-F"""
+    g = nx.Graph()
+    for node in 'ABCDEF':
+        g.add_node(node, bound=node in 'AC')
+    for u, v in ['AB', 'BC', 'CD', 'DA', 'CE', 'EF']:
+        g.add_edge(u, v, edge_id=u+v)
+    return g
+
+def test_bfs_plan():
+    p = bfs_plan(bfs_graph())
+    assert p.start() == ['AB', 'DA', 'CE']
+    assert p.get_next('CE') == ['EF']
+    tree = (frozenset('ABCDEF'), frozenset(['AB', 'DA', 'CE', 'EF']))
+    assert p.get_next('AB') == p.get_next('DA') == p.get_next('EF') == [tree]
+    assert p.get_next(tree) == ['BC', 'CD']
+    everything = (frozenset('ABCDEF'), frozenset(['AB', 'BC', 'CD', 'DA', 'CE', 'EF']))
+    assert p.get_next('BC') == p.get_next('CD') == [everything]
+    assert p.end() == [everything]
+
+def test_bfs_tree():
+    g = bfs_graph()
+    g.remove_edge('D', 'A')
+    g.nodes['C']['bound'] = False
+    p = bfs_plan(g)
+    assert p.start() == ['AB']
+    edges = [x for x in list(p.nexts) + list(p.prevs) if isinstance(x, str)]
+    assert sorted(set(edges)) == ['AB', 'BC', 'CD', 'CE', 'EF']
+    assert all(isinstance(x, TerminalEvent) for x in p.end())
+
+def slow_component_plan(component, *args):
+    if 'slow' in component:
+        time.sleep(60)
+    return generate_component_plan(component, *args)
+
+def test_plan_components(monkeypatch):
+    components = [ bfs_graph(), bfs_graph() ]
+    components[1].add_edge('A', 'slow', edge_id='Aslow')
+    components[1].nodes['slow']['bound'] = False
+    plans, complete = plan_components([g.copy() for g in components], workers=2, timeout=30)
+    assert complete
+    for component, plan in zip(components, plans):
+        assert plan_layout(plan) == plan_layout(generate_component_plan(component.copy()))
+    monkeypatch.setattr(src.generate_plan, 'generate_component_plan', slow_component_plan)
+    start = time.monotonic()
+    plans, complete = plan_components([g.copy() for g in components], workers=2, timeout=2)
+    assert time.monotonic() - start < 30
+    assert not complete
+    assert plan_layout(plans[0]) == plan_layout(generate_component_plan(components[0].copy()))
+    assert plan_layout(plans[1]) == plan_layout(bfs_plan(components[1]))
+
+def test_timeout_per_component(monkeypatch):
+    """With one worker, the components queued behind a slow one still get their full time"""
+    slow = bfs_graph()
+    slow.add_edge('A', 'slow', edge_id='Aslow')
+    slow.nodes['slow']['bound'] = False
+    components = [ slow, bfs_graph(), bfs_graph() ]
+    monkeypatch.setattr(src.generate_plan, 'generate_component_plan', slow_component_plan)
+    plans, complete = plan_components([g.copy() for g in components], workers=1, timeout=1)
+    assert not complete
+    assert plan_layout(plans[0]) == plan_layout(bfs_plan(components[0]))
+    for component, plan in zip(components[1:], plans[1:]):
+        assert plan_layout(plan) == plan_layout(generate_component_plan(component.copy()))
+
+def failing_component_plan(component, *args):
+    raise ValueError('no plan')
+
+def test_component_failure(monkeypatch):
+    monkeypatch.setattr(src.generate_plan, 'generate_component_plan', failing_component_plan)
+    with pytest.raises(ValueError):
+        plan_components([bfs_graph(), bfs_graph()], workers=2)
@@ -25,4 +25,17 @@ def test_simple():
     assert len(nxg.nodes) == 2
     assert len(nxg.edges) == 1
     assert nxg.nodes['n02']['bound']
-    assert not nxg.nodes['n01']['bound']
\ No newline at end of file
+    assert not nxg.nodes['n01']['bound']
+def test_parallel_edges():
+    """Two predicates between the same nodes, one of them the inverse"""
+    query_graph = {
+        "nodes": {"n0": {"ids": ["NC:7"]}, "n1": {}},
+        "edges": {
+            "e0": {"subject": "n0", "object": "n1", "predicates": ["biolink:treats"]},
+            "e1": {"subject": "n1", "object": "n0", "predicates": ["biolink:treated_by"]},
+            "e2": {"subject": "n0", "object": "n1", "predicates": ["biolink:related_to"]},
+        }
+    }
+    nxg = convert_to_networkx(query_graph)
+    assert len(nxg.edges) == 1
+    assert nxg.edges['n0','n1']['edge_ids'] == ['e0','e1','e2']
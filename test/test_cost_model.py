@@ -0,0 +1,70 @@
+from src.cost_model import CostModel
+from src.generate_plan import generate_plan
+from test_plans import construct_trapi
+
+def bound_path(ids):
+    """A-B-C-D with A and D bound to however many ids"""
+    trapi = construct_trapi({'A': True, 'B': False, 'C': False, 'D': True},
+                            {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'CD': ('C', 'D')})
+    for node, n in ids.items():
+        trapi['nodes'][node]['ids'] = [f'X:{i}' for i in range(n)]
+    return trapi
+
+def test_no_statistics():
+    """Without statistics, we walk in from both ends and meet in the middle, just like without a cost model"""
+    trapi = bound_path({'A': 1, 'D': 1})
+    plan = generate_plan(trapi, cost_model=CostModel())[0]
+    assert plan.nexts == generate_plan(trapi)[0].nexts
+
+def test_walk_from_small_end():
+    """If one end is a lot smaller than the other, walk from it"""
+    trapi = bound_path({'A': 1, 'D': 1})
+    plan = generate_plan(trapi, cost_model=CostModel(node_sizes={'A': 10**5}))[0]
+    assert plan.start() == ['CD']
+    assert plan.get_next('CD') == ['BC']
+    assert plan.get_next('BC') == ['AB']
+    join = (frozenset(['A','B','C','D']), frozenset(['AB','BC','CD']))
+    assert plan.get_next('AB') == [join]
+    assert plan.get_prev(join) == ['AB']
+
+def test_fanout():
+    """A huge fan-out edge should be walked last"""
+    trapi = bound_path({'A': 1, 'D': 1})
+    trapi['edges']['BC']['predicates'] = ['biolink:related_to']
+    cost_model = CostModel(predicate_fanouts={'biolink:related_to': 10**6}, edge_fanouts={'AB': 10})
+    plan = generate_plan(trapi, cost_model=cost_model)[0]
+    assert plan.start() == ['AB','CD']
+    assert plan.get_next('AB') == ['BC']
+    assert plan.get_next('CD') == [(frozenset(['A','B','C','D']), frozenset(['AB','BC','CD']))]
+    cost_model = CostModel(predicate_fanouts={'biolink:related_to': 10**6}, edge_fanouts={'CD': 10})
+    plan = generate_plan(trapi, cost_model=cost_model)[0]
+    assert plan.get_next('CD') == ['BC']
+
+def test_path_order():
+    """Two loops of the same length off of different bound nodes: do the one on the smaller node first"""
+    trapi = construct_trapi({'A': True, 'B': False, 'C': False, 'D': True, 'E': False, 'F': False, 'G': False},
+                            {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'CA': ('C', 'A'), 'CG': ('C', 'G'),
+                             'GE': ('G', 'E'), 'DE': ('D', 'E'), 'EF': ('E', 'F'), 'FD': ('F', 'D')})
+    a_loop = (frozenset(['A','B','C']), frozenset(['AB','BC','CA']))
+    d_loop = (frozenset(['D','E','F']), frozenset(['DE','EF','FD']))
+    plans = generate_plan(trapi)
+    #The loops don't share any unbound nodes, so both start at once, and C-G-E joins them.  That join builds on the
+    # loop that was done last, so it only holds what the first loop and C-G-E added.
+    merge = plans[0].get_next('CG')[0]
+    assert merge.parent == d_loop
+    assert merge.new_nodes == a_loop[0] | {'G'}
+    trapi['nodes']['A']['ids'] = [f'X:{i}' for i in range(100)]
+    plans = generate_plan(trapi, cost_model=CostModel())
+    merge = plans[0].get_next('CG')[0]
+    assert merge.parent == a_loop
+    assert merge.new_nodes == d_loop[0] | {'G'}
+
+def test_parallel_edges():
+    """Results of a hop have to match each of its parallel edges, so the hop is only as big as the smallest of them"""
+    trapi = bound_path({'A': 1, 'D': 1})
+    trapi['edges']['AB2'] = {'subject': 'A', 'object': 'B'}
+    cost_model = CostModel(edge_fanouts={'AB': 10**6, 'AB2': 1, 'CD': 1000})
+    plan = generate_plan(trapi, cost_model=cost_model)[0]
+    #AB2 makes A-B a cheap hop, so we walk on from A to C, rather than from D to B
+    assert plan.get_next('CD') == [(frozenset(['A','B','C','D']), frozenset(['AB','AB2','BC','CD']))]
+    assert plan.get_next(plan.get_next('AB')[0]) == ['BC']
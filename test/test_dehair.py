@@ -60,3 +60,32 @@ def test_dangler():
     assert len(components.nodes) == 3
     assert dep_graph.start() == ['x']
     assert isinstance(dep_graph.get_next('x')[0], TerminalEvent)
+
+def test_long_hair():
+    """A 1000-hop from a bound node is all hair"""
+    g = nx.Graph()
+    g.add_node('n0',bound=True)
+    for i in range(1,1001):
+        g.add_node(f'n{i}',bound=False)
+        g.add_edge(f'n{i-1}',f'n{i}',edge_id=f'e{i}')
+    dep_graph,components = dehair(g)
+    assert list(components.nodes) == ['n0']
+    assert dep_graph.start() == ['e1']
+    for i in range(1,1000):
+        assert dep_graph.get_next(f'e{i}') == [f'e{i+1}']
+    assert isinstance(dep_graph.get_next('e1000')[0], TerminalEvent)
+
+def test_tree():
+    """A binary tree hanging off a bound root: every edge follows the edge into its parent"""
+    g = nx.Graph()
+    g.add_node(1,bound=True)
+    for i in range(2,512):
+        g.add_node(i,bound=False)
+        g.add_edge(i//2,i,edge_id=f'e{i}')
+    dep_graph,components = dehair(g)
+    assert list(components.nodes) == [1]
+    assert sorted(dep_graph.start()) == ['e2','e3']
+    for i in range(2,256):
+        assert sorted(dep_graph.get_next(f'e{i}')) == sorted([f'e{2*i}',f'e{2*i+1}'])
+    for i in range(256,512):
+        assert isinstance(dep_graph.get_next(f'e{i}')[0], TerminalEvent)
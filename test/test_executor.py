@@ -0,0 +1,201 @@
+import asyncio
+import pytest
+
+from src.executor import PlanExecutor, StreamingPlanExecutor
+from src.generate_plan import generate_plan
+from src.QueryPlan import JoinEvent
+from test_plans import construct_trapi, readme_trapi
+
+def readme_plans():
+    return generate_plan(readme_trapi())
+
+class Recorder:
+    def __init__(self):
+        self.done = []
+        self.running = 0
+        self.most_running = 0
+    async def __call__(self, edge_id):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.001)
+        self.running -= 1
+        self.done.append(edge_id)
+        return edge_id.lower()
+
+def test_runs_everything_in_order():
+    """Every edge runs once, and only after all its upstream edges"""
+    plans = readme_plans()
+    recorder = Recorder()
+    results = asyncio.run(PlanExecutor(plans, recorder).run())
+    assert results[0] == {'AB': 'ab'}
+    assert set(results[1]) == set(['AC','BC','CD','DE','DF','EF','FG','GH','GI'])
+    assert sorted(recorder.done) == sorted(['AB','AC','BC','CD','DE','DF','EF','FG','GH','GI'])
+    order = {edge: i for i, edge in enumerate(recorder.done)}
+    for later, earlier in [('CD','AC'), ('CD','BC'), ('GI','AC'), ('DF','CD'), ('DE','DF'), ('DE','FG'),
+                           ('GH','DE'), ('GH','EF')]:
+        assert order[later] > order[earlier]
+    #AB, AC and BC are all independent
+    assert recorder.most_running >= 3
+
+def test_joins():
+    joins = []
+    async def on_join(join):
+        joins.append(join)
+    asyncio.run(PlanExecutor(readme_plans(), Recorder(), on_join=on_join).run())
+    assert [len(nodes) for nodes, edges in joins] == [3, 7, 8]
+
+def test_prune():
+    """Each edge gets the ids of its input node from whatever last produced them"""
+    received = {}
+    async def callback(edge_id, ids):
+        received[edge_id] = ids
+        return edge_id.lower()
+    async def on_join(join):
+        return len(join[0])
+    def prune(node, source, result):
+        return (node, result)
+    asyncio.run(PlanExecutor(readme_plans(), callback, on_join=on_join, prune=prune).run())
+    assert received['AB'] == ('A', None)
+    assert received['CD'] == ('C', 3)
+    assert received['DF'] == ('D', 'cd')
+    assert received['EF'] == ('F', 7)
+    assert received['GH'] == ('G', 8)
+
+def test_limits():
+    recorder = Recorder()
+    asyncio.run(PlanExecutor(readme_plans(), recorder, max_concurrency=1).run())
+    assert recorder.most_running == 1
+    recorder = Recorder()
+    asyncio.run(PlanExecutor(readme_plans(), recorder, max_per_plan=1).run())
+    assert recorder.most_running == 2
+    #When streaming, a pipeline takes one turn of the limits for all of its edges, and none of them start before
+    # it has it
+    trapi = construct_trapi({'hub': True, **{ f'{x}{i}': False for i in range(4) for x in 'ab' }},
+                            { **{ f'hub_a{i}': ('hub', f'a{i}') for i in range(4) },
+                              **{ f'a{i}_b{i}': (f'a{i}', f'b{i}') for i in range(4) } })
+    running = set()
+    most_running = []
+    async def callback(edge_id, upstream):
+        branch = edge_id[-1]
+        running.add(edge_id)
+        most_running.append(len(set(x[-1] for x in running)))
+        if upstream is not None:
+            async for batch in upstream:
+                pass
+        await asyncio.sleep(0.001)
+        yield branch
+        running.remove(edge_id)
+    #The bound hub splits the branches into separate plans
+    results = asyncio.run(StreamingPlanExecutor(generate_plan(trapi), callback, max_concurrency=1).run())
+    assert sum(map(len, results)) == 8
+    assert max(most_running) == 1
+    most_running.clear()
+    asyncio.run(StreamingPlanExecutor(generate_plan(trapi), callback, max_concurrency=2).run())
+    assert max(most_running) == 2
+
+def test_failure():
+    async def callback(edge_id):
+        if edge_id == 'CD':
+            raise ValueError(edge_id)
+        await asyncio.sleep(0.001)
+    with pytest.raises(ValueError):
+        asyncio.run(PlanExecutor(readme_plans(), callback).run())
+
+def test_streaming():
+    """Down a long chain, the last edge sees results before the first edge has finished"""
+    trapi = construct_trapi({f'n{i}': i == 0 for i in range(6)}, {f'e{i}': (f'n{i}', f'n{i+1}') for i in range(5)})
+    events = []
+    async def callback(edge_id, upstream):
+        if upstream is None:
+            for batch in range(5):
+                await asyncio.sleep(0.001)
+                events.append((edge_id, batch))
+                yield batch
+        else:
+            async for batch in upstream:
+                events.append((edge_id, batch))
+                yield batch + 10
+        events.append((edge_id, 'done'))
+    results = asyncio.run(StreamingPlanExecutor(generate_plan(trapi), callback, queue_size=1).run())
+    assert results[0]['e0'] == [0, 1, 2, 3, 4]
+    assert results[0]['e4'] == [40, 41, 42, 43, 44]
+    assert events.index(('e4', 30)) < events.index(('e0', 4))
+    assert events.index(('e4', 'done')) > events.index(('e0', 'done'))
+
+def test_streaming_joins():
+    """Edges after a join wait for it"""
+    started = []
+    async def callback(edge_id, upstream):
+        started.append(edge_id)
+        if upstream is not None:
+            async for batch in upstream:
+                pass
+        yield edge_id
+    results = asyncio.run(StreamingPlanExecutor(readme_plans(), callback).run())
+    assert results[1]['GH'] == ['GH']
+    for later, earlier in [('CD','AC'), ('CD','BC'), ('DE','FG'), ('GH','DE')]:
+        assert started.index(later) > started.index(earlier)
+
+def test_streaming_early_stop():
+    """A callback doesn't have to read everything from upstream"""
+    trapi = construct_trapi({'n0': True, 'n1': False, 'n2': False}, {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2')})
+    async def callback(edge_id, upstream):
+        if upstream is None:
+            for batch in range(10):
+                yield batch
+        else:
+            async for batch in upstream:
+                yield batch
+                break
+    results = asyncio.run(StreamingPlanExecutor(generate_plan(trapi), callback, queue_size=1).run())
+    assert results[0] == {'e0': list(range(10)), 'e1': [0]}
+
+def test_streaming_prune():
+    """Edges that don't stream get the surviving ids as their upstream"""
+    received = {}
+    async def callback(edge_id, upstream):
+        if upstream is None or isinstance(upstream, tuple):
+            received[edge_id] = upstream
+        else:
+            async for batch in upstream:
+                pass
+        yield edge_id
+    def prune(node, source, result):
+        return (node, result)
+    async def on_join(join):
+        return len(join[0])
+    asyncio.run(StreamingPlanExecutor(readme_plans(), callback, on_join=on_join, prune=prune).run())
+    assert received['CD'] == ('C', 3)
+    assert received['GI'] == ('I', None)
+    assert 'DF' not in received and 'FG' not in received
+
+def test_streaming_barriers():
+    """Joins, and the edges after them, wait until every streamed edge upstream of them has ended"""
+    chain = construct_trapi({'A': True, 'B': False, 'C': False, 'D': False, 'E': True},
+                            {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'CD': ('C', 'D'), 'DE': ('D', 'E')})
+    for plans in (generate_plan(chain), readme_plans()):
+        events = []
+        async def callback(edge_id, upstream):
+            events.append(('start', edge_id))
+            if upstream is not None:
+                async for batch in upstream:
+                    pass
+            if edge_id in ('BC', 'CD', 'DF', 'FG'):
+                await asyncio.sleep(0.01)
+            yield edge_id
+            events.append(('end', edge_id))
+        async def on_join(join):
+            events.append(('join', join))
+        asyncio.run(StreamingPlanExecutor(plans, callback, on_join=on_join).run())
+        for plan in plans:
+            compiled = plan.compile()
+            for x in plan.prevs:
+                if isinstance(x, JoinEvent):
+                    when = events.index(('join', x))
+                elif isinstance(x, str) and compiled.streams_from[compiled.event_id(x)] < 0:
+                    when = events.index(('start', x))
+                else:
+                    continue
+                for prev in plan.get_prev(x):
+                    if isinstance(prev, str):
+                        assert events.index(('end', prev)) < when, (prev, x)
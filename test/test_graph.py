@@ -0,0 +1,83 @@
+import networkx as nx
+
+from bench import query_graphs
+from src import graph as graphs
+from src.generate_plan import generate_plan
+from src.query_graph import convert_to_graph, convert_to_networkx
+from src.QueryPlan import TerminalEvent
+
+def test_graph():
+    g = graphs.Graph()
+    g.add_node('n0', bound=True)
+    g.add_edge('n0', 'n1', edge_id='e0')
+    g.add_edge('n1', 'n2', edge_id='e1')
+    assert list(g.nodes) == ['n0', 'n1', 'n2']
+    assert g.nodes['n0']['bound']
+    assert g.degree['n1'] == 2
+    assert g.get_edge_data('n1', 'n0')['edge_id'] == 'e0'
+    assert g.edges['n2', 'n1']['edge_id'] == 'e1'
+    assert g.number_of_edges() == 2
+    assert sorted(g.edges()) == [('n0', 'n1'), ('n1', 'n2')]
+    h = g.subgraph(['n1', 'n2'])
+    assert list(h.nodes) == ['n1', 'n2']
+    assert h.number_of_edges() == 1
+    h.remove_node('n2')
+    assert g.has_edge('n1', 'n2')
+    g.remove_edge('n0', 'n1')
+    assert not g.has_edge('n1', 'n0')
+    assert [sorted(c) for c in graphs.connected_components(g)] == [['n0'], ['n1', 'n2']]
+    assert not graphs.is_connected(g)
+
+def test_same_as_networkx():
+    """The conversions agree"""
+    trapi = query_graphs.readme(2)
+    g = convert_to_graph(trapi)
+    nxg = convert_to_networkx(trapi)
+    assert list(g.nodes(data=True)) == list(nxg.nodes(data=True))
+    assert sorted(g.edges(data=True), key=str) == sorted(nxg.edges(data=True), key=str)
+    assert sorted(map(sorted, graphs.connected_components(g))) == sorted(map(sorted, nx.connected_components(nxg)))
+
+def test_shortest_simple_paths():
+    """Same paths as networkx, shortest first"""
+    g = convert_to_networkx(query_graphs.grid(3))
+    ours = list(graphs.shortest_simple_paths(g, 'n0_0', 'n2_2'))
+    theirs = list(nx.shortest_simple_paths(g, 'n0_0', 'n2_2'))
+    assert [len(p) for p in ours] == sorted(len(p) for p in ours)
+    assert sorted(ours) == sorted(theirs)
+    assert list(graphs.shortest_simple_paths(g, 'n0_0', 'n2_2', ignore_nodes={'n1_1', 'n0_1'}))[0] == ['n0_0', 'n1_0', 'n2_0', 'n2_1', 'n2_2']
+    g.remove_nodes_from(['n0_1', 'n1_0'])
+    assert list(graphs.shortest_simple_paths(g, 'n0_0', 'n2_2')) == []
+
+def plan_structure(plan):
+    def name(x):
+        return ('terminal', x.name) if isinstance(x, TerminalEvent) else x
+    return { name(x): sorted(map(name, nexts), key=str) for x, nexts in plan.nexts.items() }
+
+def test_backends_agree():
+    for family in ['chain', 'star', 'hairy_tree', 'cycle', 'grid', 'clique', 'readme']:
+        for bound in (1, 2, 3):
+            trapi = query_graphs.FAMILIES[family](4, bound)
+            ours = generate_plan(trapi)
+            theirs = generate_plan(trapi, backend='networkx')
+            assert len(ours) == len(theirs)
+            assert sorted(map(plan_structure, ours), key=str) == sorted(map(plan_structure, theirs), key=str)
+
+def test_isomorphism():
+    bound = lambda graph, node: graph.nodes[node]['bound']
+    ids = lambda edge_data: 1
+    g = convert_to_graph(query_graphs.grid(3, 2))
+    h = graphs.Graph()
+    names = {node: f'x{i}' for i, node in enumerate(reversed(list(g.nodes)))}
+    for node, data in reversed(list(g.nodes(data=True))):
+        h.add_node(names[node], **data)
+    for u, v in g.edges():
+        h.add_edge(names[v], names[u], edge_id='whatever')
+    assert graphs.graph_hash(g, bound, ids) == graphs.graph_hash(h, bound, ids)
+    mapping = graphs.find_isomorphism(g, h, bound, ids)
+    for u, v in g.edges():
+        assert h.has_edge(mapping[u], mapping[v])
+    for node in g:
+        assert g.nodes[node]['bound'] == h.nodes[mapping[node]]['bound']
+    h.nodes[names['n0_0']]['bound'] = False
+    h.nodes[names['n1_1']]['bound'] = True
+    assert graphs.find_isomorphism(g, h, bound, ids) is None
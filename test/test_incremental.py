@@ -0,0 +1,51 @@
+import pytest
+
+from bench import query_graphs
+from src.generate_plan import generate_plan
+from src.incremental import IncrementalPlanner
+from src.plan_stats import PlanStats
+from test_plans import plan_layout
+
+def edge(subject, object):
+    return {'subject': subject, 'object': object, 'predicates': ['biolink:related_to']}
+
+def check(planner):
+    """Same as planning from scratch"""
+    assert [plan_layout(p) for p in planner.plans] == [plan_layout(p) for p in generate_plan(planner.query_graph)]
+
+def test_edits():
+    stats = PlanStats()
+    planner = IncrementalPlanner(query_graphs.readme(3), stats=stats)
+    check(planner)
+    assert len(planner.plans) == 6
+    #Another hair on the last copy's H
+    planner.apply({'add_nodes': {'X': {'categories': ['biolink:Gene']}}, 'add_edges': {'HX': edge('H2', 'X')}})
+    check(planner)
+    assert stats.counts['components_reused'] == 2
+    assert stats.counts['cores_reused'] == 1
+    #and take it away again
+    planner.apply({'remove_nodes': ['X']})
+    check(planner)
+    assert stats.counts['components_reused'] == 4
+    assert stats.counts['cores_reused'] == 2
+    #Bind a node in the middle of the first copy
+    planner.apply({'update_nodes': {'D0': {'ids': ['CURIE:D']}}})
+    check(planner)
+    assert stats.counts['components_reused'] == 6
+    #A shortcut in the second copy
+    planner.apply({'add_edges': {'shortcut': edge('C0', 'H1')}})
+    check(planner)
+    planner.apply({'remove_edges': ['shortcut', 'AB1']})
+    check(planner)
+
+def test_plans_are_copies():
+    planner = IncrementalPlanner(query_graphs.readme(2))
+    for plan in planner.plans:
+        plan.nexts.clear()
+    planner.apply({'update_nodes': {'H0': {'ids': ['CURIE:H']}}})
+    check(planner)
+
+def test_bad_update():
+    planner = IncrementalPlanner(query_graphs.chain(3))
+    with pytest.raises(KeyError):
+        planner.apply({'update_nodes': {'nope': {}}})
@@ -0,0 +1,110 @@
+import asyncio
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.executor import PlanExecutor
+from src.generate_plan import generate_plan
+from src.join_engine import ColumnarJoiner, Interner, ResultTable, join_tables
+from test_plans import construct_trapi
+
+def dict_join(left, right):
+    """The obvious join of two lists of row dicts, to check against"""
+    joined = []
+    for l in left:
+        for r in right:
+            if all(l[k] == r[k] for k in l.keys() & r.keys()):
+                joined.append({**l, **r})
+    return joined
+
+def as_set(rows):
+    return sorted( tuple(sorted(row.items())) for row in rows )
+
+def random_rows(rng, names, n, values=5):
+    return [ { name: f'{name}:{rng.randrange(values)}' for name in names } for _ in range(n) ]
+
+def test_interner():
+    interner = Interner()
+    ids = interner.intern_all(['MONDO:1', 'HP:2', 'MONDO:1'])
+    assert ids.dtype == np.int64
+    assert list(ids) == [0, 1, 0]
+    assert interner.lookup(ids) == ['MONDO:1', 'HP:2', 'MONDO:1']
+    assert len(interner) == 2
+
+def test_round_trip():
+    interner = Interner()
+    rows = [{'A': 'MONDO:1', 'B': 'HP:2'}, {'A': 'MONDO:3', 'B': 'HP:2'}]
+    table = ResultTable.from_rows(rows, interner)
+    assert len(table) == 2
+    assert table.to_rows(interner) == rows
+    assert table.take([1]).to_rows(interner) == rows[1:]
+    with pytest.raises(ValueError):
+        ResultTable({'A': [1, 2], 'B': [1]})
+
+@pytest.mark.parametrize('method', ['sort', 'hash'])
+def test_join_tables(method):
+    """Both joins agree with the obvious join, on one key column, two, or none"""
+    rng = random.Random(0)
+    for left_names, right_names in [ ('AB', 'BC'), ('ABC', 'BCD'), ('AB', 'CD'), ('A', 'A') ]:
+        interner = Interner()
+        left = random_rows(rng, left_names, 30)
+        right = random_rows(rng, right_names, 20)
+        joined = join_tables(ResultTable.from_rows(left, interner), ResultTable.from_rows(right, interner), method=method)
+        assert as_set(joined.to_rows(interner)) == as_set(dict_join(left, right))
+
+@pytest.mark.parametrize('method', ['sort', 'hash'])
+def test_empty(method):
+    interner = Interner()
+    left = ResultTable.from_rows([{'A': 'x', 'B': 'y'}], interner)
+    right = ResultTable({'B': [], 'C': []})
+    assert len(join_tables(left, right, method=method)) == 0
+    assert len(join_tables(right, left, method=method)) == 0
+
+def test_unknown_method():
+    table = ResultTable({'A': [1]})
+    with pytest.raises(ValueError):
+        join_tables(table, table, method='nested')
+
+def two_bound_plan():
+    #A and C are bound, so AB and BC run first and meet in a join on B, and then BD runs
+    trapi = construct_trapi({'A': True, 'B': False, 'C': True, 'D': False},
+                            {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'BD': ('B', 'D')})
+    plans = generate_plan(trapi)
+    assert len(plans) == 1
+    return plans[0]
+
+def test_joiner():
+    plan = two_bound_plan()
+    join = plan.get_next('AB')[0]
+    assert set(plan.get_prev(join)) == {'AB', 'BC'}
+    interner = Interner()
+    ab = [{'A': 'a', 'B': f'b{i}', 'AB': f'ab{i}'} for i in range(5)]
+    bc = [{'B': f'b{i}', 'C': 'c', 'BC': f'bc{i}'} for i in range(3, 8)]
+    tables = { 'AB': ResultTable.from_rows(ab, interner), 'BC': ResultTable.from_rows(bc, interner) }
+    joiner = ColumnarJoiner(plan)
+    joined = joiner.join(join, [ tables[x] for x in plan.get_prev(join) ])
+    assert set(joined.columns) == {'A', 'B', 'C', 'AB', 'BC'}
+    assert as_set(joined.to_rows(interner)) == as_set(dict_join(ab, bc))
+    with pytest.raises(ValueError):
+        joiner.join(join, [tables['AB']])
+
+def test_joiner_in_executor():
+    """on_join can run the joins as the executor reaches them"""
+    plan = two_bound_plan()
+    interner = Interner()
+    rows = { 'AB': [{'A': 'a', 'B': f'b{i}', 'AB': f'ab{i}'} for i in range(4)],
+             'BC': [{'B': f'b{i}', 'C': 'c', 'BC': f'bc{i}'} for i in range(2, 6)],
+             'BD': [{'B': 'b2', 'D': 'd', 'BD': 'bd'}] }
+    tables = {}
+    async def run_edge(edge):
+        tables[edge] = ResultTable.from_rows(rows[edge], interner)
+        return len(tables[edge])
+    joiner = ColumnarJoiner(plan, method='hash')
+    async def on_join(event):
+        tables[event] = joiner.join(event, [ tables[x] for x in plan.get_prev(event) ])
+    asyncio.run(PlanExecutor([plan], run_edge, on_join=on_join).run())
+    joined = [ table for event, table in tables.items() if event not in rows ]
+    assert len(joined) == 1
+    assert sorted( row['B'] for row in joined[0].to_rows(interner) ) == ['b2', 'b3']
@@ -0,0 +1,65 @@
+import pickle
+
+from bench import query_graphs
+from src.generate_plan import generate_plan
+from src.QueryPlan import JoinEvent, QueryPlan
+from test_compiled_plan import readme_plan
+from test_plans import plan_layout
+
+def joins(plan):
+    return [ x for x in plan.prevs if isinstance(x, JoinEvent) ]
+
+def test_like_a_tuple():
+    parent = JoinEvent(None, ['A', 'B'], ['AB'])
+    join = JoinEvent(parent, ['C'], ['BC', 'AC'])
+    as_tuple = (frozenset(['A', 'B', 'C']), frozenset(['AB', 'BC', 'AC']))
+    assert join == as_tuple and as_tuple == join
+    assert hash(join) == hash(as_tuple)
+    assert { as_tuple: 1 }[join] == 1
+    assert join != parent
+    nodes, edges = join
+    assert nodes == join[0] == join.nodes == as_tuple[0]
+    assert join.new_nodes == frozenset(['C'])
+    assert (parent.depth, join.depth) == (0, 1)
+    assert JoinEvent(None, as_tuple[0], as_tuple[1]) == join
+
+def test_deltas():
+    """Each join in the README plan only holds what its path added"""
+    plan = readme_plan()
+    join1, join2, join3 = sorted(joins(plan), key=lambda j: j.depth)
+    assert join1.new_nodes == frozenset(['A', 'B', 'C'])
+    assert join2.parent is join1
+    assert join3.parent is join2
+    assert join3.new_nodes == frozenset(['E'])
+    assert join3.new_edges == frozenset(['DE', 'EF'])
+    assert len(join3.nodes) == 8
+    assert plan.get_next(join3) == ['GH']
+
+def test_pickle():
+    plan = readme_plan()
+    copy = pickle.loads(pickle.dumps(plan))
+    assert [ (j.depth, j.new_nodes, j.new_edges) for j in joins(copy) ] == [ (j.depth, j.new_nodes, j.new_edges) for j in joins(plan) ]
+    assert plan_layout(copy) == plan_layout(plan)
+
+def test_relabel_and_reload():
+    plan = generate_plan(query_graphs.grid(3, 2))[0]
+    for copy in (plan.relabel({'n0_0': 'corner'}), QueryPlan.from_bytes(plan.to_bytes()), QueryPlan.from_json(plan.to_json())):
+        for old, new in zip(joins(plan), joins(copy)):
+            assert new.depth == old.depth
+            assert (new.parent is None) == (old.parent is None)
+            assert len(new.new_edges) == len(old.new_edges)
+
+def test_plan_ids():
+    """Joins are numbered uniquely within a compiled plan, and the same way in a relabelled or reloaded plan"""
+    plan = generate_plan(query_graphs.grid(3, 2))[0]
+    compiled = plan.compile()
+    ids = [ compiled.event_id(j) for j in joins(plan) ]
+    assert len(set(ids)) == len(ids)
+    for copy in (plan.relabel({'n0_0': 'corner'}), QueryPlan.from_bytes(plan.to_bytes())):
+        assert [ copy.compile().event_id(j) for j in joins(copy) ] == ids
+
+def test_materialized_once():
+    parent = JoinEvent(None, ['A', 'B'], ['AB'])
+    join = JoinEvent(parent, ['C'], ['BC', 'AC'])
+    assert join.nodes is join.nodes and join.edges is join.edges
+    assert join.nodes == frozenset(['A', 'B', 'C'])
@@ -0,0 +1,158 @@
+from multiprocessing import Pool
+import sqlite3
+
+from src.generate_plan import generate_plan
+from src.plan_cache import PlanCache, DiskPlanCache
+from src.QueryPlan import TerminalEvent
+from test_plans import construct_trapi, plan_layout
+
+def test_hit_relabels():
+    """A second query of the same shape is served from the cache, with its own names"""
+    cache = PlanCache()
+    trapi = construct_trapi({'n0': True, 'n1': False, 'n2': True, 'n3': False},
+                            {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n1', 'n3')})
+    generate_plan(trapi, cache=cache)
+    assert cache.misses == 1 and cache.hits == 0
+    trapi = construct_trapi({'A': True, 'B': False, 'C': False, 'D': True},
+                            {'x': ('A', 'B'), 'y': ('B', 'C'), 'z': ('D', 'B')})
+    plans = generate_plan(trapi, cache=cache)
+    assert cache.misses == 1 and cache.hits == 1
+    assert len(plans) == 1
+    plan = plans[0]
+    assert set(plan.start()) == set(['x','z'])
+    join = (frozenset(['A','B','D']),frozenset(['x','z']))
+    assert plan.get_next('x') == plan.get_next('z') == [join]
+    assert plan.get_next(join) == ['y']
+    assert isinstance(plan.get_next('y')[0], TerminalEvent)
+
+def test_bound_matters():
+    """Same structure but bound in a different place is a different shape"""
+    cache = PlanCache()
+    edges = {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n1', 'n3'), 'e3': ('n3', 'n4')}
+    generate_plan(construct_trapi({'n0': True, 'n1': False, 'n2': False, 'n3': False, 'n4': False}, edges), cache=cache)
+    plans = generate_plan(construct_trapi({'n0': False, 'n1': False, 'n2': False, 'n3': False, 'n4': True}, edges), cache=cache)
+    assert cache.misses == 2 and cache.hits == 0
+    assert plans[0].start() == ['e3']
+
+def test_cache_owns_plans():
+    """Messing with returned plans doesn't hurt the cache"""
+    cache = PlanCache()
+    trapi = construct_trapi({'n0': True, 'n1': False, 'n2': False, 'n3': False},
+                            {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n1', 'n3')})
+    generate_plan(trapi, cache=cache)[0].nexts.clear()
+    plan = generate_plan(trapi, cache=cache)[0]
+    assert cache.hits == 1
+    assert plan.start() == ['e0']
+
+def test_lru():
+    cache = PlanCache(maxsize=1)
+    branch = construct_trapi({'n0': True, 'n1': False, 'n2': False, 'n3': False},
+                             {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n1', 'n3')})
+    long_branch = construct_trapi({'n0': True, 'n1': False, 'n2': False, 'n3': False, 'n4': False},
+                                  {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n1', 'n3'), 'e3': ('n3', 'n4')})
+    generate_plan(branch, cache=cache)
+    generate_plan(long_branch, cache=cache)
+    generate_plan(branch, cache=cache)
+    assert len(cache) == 1
+    assert cache.hits == 0 and cache.misses == 3
+
+def test_parallel_edges():
+    """The number of parallel edges is part of the shape"""
+    cache = PlanCache()
+    nodes = {'n0': True, 'n1': False, 'n2': False, 'n3': False}
+    edges = {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n1', 'n3')}
+    generate_plan(construct_trapi(nodes, edges), cache=cache)
+    plans = generate_plan(construct_trapi(nodes, dict(edges, p=('n1', 'n0'))), cache=cache)
+    assert cache.hits == 0
+    assert plans[0].start() == ['e0','p']
+    plans = generate_plan(construct_trapi({'A': False, 'B': True, 'C': False, 'D': False},
+                                          {'x': ('A', 'B'), 'y': ('A', 'B'), 'z': ('C', 'A'), 'w': ('A', 'D')}), cache=cache)
+    assert cache.hits == 1
+    assert set(plans[0].start()) == set(['x','y'])
+    assert plans[0].get_next('x') == [(frozenset(['A','B']), frozenset(['x','y']))]
+
+def test_trivial_shapes_skip_cache():
+    """One-hops are quicker to plan than to look up"""
+    cache = PlanCache()
+    trapi = construct_trapi({'n0': True, 'n1': False}, {'e0': ('n0', 'n1')})
+    generate_plan(trapi, cache=cache)
+    plan = generate_plan(trapi, cache=cache)[0]
+    assert plan.start() == ['e0']
+    assert cache.hits == cache.misses == 0
+
+def branches(n):
+    """Query graphs with a bound node, a branch point, and n hairs, under different names"""
+    nodes = {'A': True, 'B': False}
+    edges = {'AB': ('A', 'B')}
+    for i in range(n):
+        nodes[f'X{i}'] = False
+        edges[f'BX{i}'] = ('B', f'X{i}')
+    return construct_trapi(nodes, edges)
+
+def test_disk_cache(tmp_path):
+    """A new DiskPlanCache on the same file picks up where the last one left off"""
+    path = str(tmp_path / 'plans.db')
+    trapi = construct_trapi({'n0': True, 'n1': False, 'n2': True, 'n3': False},
+                            {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n1', 'n3')})
+    expected = generate_plan(trapi)
+    cache = DiskPlanCache(path)
+    generate_plan(trapi, cache=cache)
+    assert cache.misses == 1 and len(cache) == 1
+    cache = DiskPlanCache(path)
+    plans = generate_plan(trapi, cache=cache)
+    assert cache.hits == 1
+    assert [plan_layout(p) for p in plans] == [plan_layout(p) for p in expected]
+    renamed = construct_trapi({'A': True, 'B': False, 'C': False, 'D': True},
+                              {'x': ('A', 'B'), 'y': ('B', 'C'), 'z': ('D', 'B')})
+    plans = generate_plan(renamed, cache=cache)
+    assert cache.hits == 2
+    join = (frozenset(['A','B','D']),frozenset(['x','z']))
+    assert plans[0].get_next('x') == plans[0].get_next('z') == [join]
+    generate_plan(renamed, cache=cache, max_paths=3)
+    assert cache.misses == 1 and len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskPlanCache(str(tmp_path / 'plans.db'), max_bytes=600, touch_after=0)
+    for n in range(3, 13):
+        generate_plan(branches(2), cache=cache)
+        generate_plan(branches(n), cache=cache)
+    assert cache.hits == 9
+    assert 1 < len(cache) < 10
+    #The one that keeps getting used is still there
+    generate_plan(branches(2), cache=cache)
+    assert cache.hits == 10
+
+def test_disk_cache_touch(tmp_path):
+    """A hit only writes the time it was used when the last time written is more than touch_after seconds old"""
+    path = str(tmp_path / 'plans.db')
+    cache = DiskPlanCache(path, touch_after=60)
+    generate_plan(branches(2), cache=cache)
+    db = sqlite3.connect(path)
+    last_used = lambda: db.execute('SELECT last_used FROM plans').fetchone()[0]
+    stored = last_used()
+    generate_plan(branches(2), cache=cache)
+    assert cache.hits == 1
+    assert last_used() == stored
+    with db:
+        db.execute('UPDATE plans SET last_used = ?', (stored - 120,))
+    generate_plan(branches(2), cache=cache)
+    assert cache.hits == 2
+    assert last_used() >= stored
+    db.close()
+
+def plan_with_disk_cache(args):
+    path, n = args
+    cache = DiskPlanCache(path)
+    for i in range(5):
+        generate_plan(branches(n + i % 3), cache=cache)
+    return cache.hits
+
+def test_disk_cache_processes(tmp_path):
+    path = str(tmp_path / 'plans.db')
+    DiskPlanCache(path)
+    with Pool(4) as pool:
+        hits = pool.map(plan_with_disk_cache, [ (path, 2 + i % 2) for i in range(8) ])
+    assert sum(hits) >= 8 * 2
+    assert len(DiskPlanCache(path)) == 4
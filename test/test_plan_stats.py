@@ -0,0 +1,32 @@
+from src.generate_plan import generate_plan
+from src.plan_stats import PlanStats
+from test_plans import construct_trapi, readme_trapi
+
+def test_counts():
+    stats = PlanStats()
+    generate_plan(readme_trapi(), stats=stats)
+    assert stats.counts['joins'] == 3
+    assert stats.counts['paths_processed'] == 3
+    assert stats.counts['paths_found'] >= 2
+    #The only loop, DEF, has no bound node on it
+    assert stats.counts['cycles_found'] == 0
+    for stage in ['generate_plan', 'convert', 'decompose', 'dehair', 'get_paths', 'process_path']:
+        assert stats.seconds[stage] > 0
+    assert stats.seconds['generate_plan'] >= stats.seconds['decompose'] + stats.seconds['process_path']
+
+def test_skipped():
+    """A-B-C-D with A and D bound, plus a shortcut B-D: the second path is only new at the shortcut"""
+    trapi = construct_trapi({'A': True, 'B': False, 'C': False, 'D': True},
+                            {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'CD': ('C', 'D'), 'BD': ('B', 'D'), 'AC': ('A', 'C')})
+    stats = PlanStats()
+    generate_plan(trapi, stats=stats)
+    assert stats.counts['paths_processed'] + stats.counts['paths_skipped'] <= stats.counts['paths_found'] + stats.counts['cycles_found']
+    assert stats.counts['joins'] == stats.counts['paths_processed']
+
+def test_callbacks():
+    stages = []
+    counts = []
+    stats = PlanStats(on_stage=lambda name, seconds: stages.append(name), on_count=lambda name, n: counts.append(name))
+    generate_plan(readme_trapi(), stats=stats)
+    assert stages[-1] == 'generate_plan'
+    assert counts.count('joins') == 3
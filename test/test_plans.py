@@ -1,5 +1,6 @@
 import networkx as nx
 
+from bench import query_graphs
 from src.generate_plan import generate_plan
 from src.QueryPlan import TerminalEvent
 
@@ -14,6 +15,10 @@ def construct_trapi(nodes,edges):
         trapi['edges'][edge_id] = {'subject': subject, 'object': object}
     return trapi
 
+def readme_trapi():
+    """The query graph in README.md"""
+    return construct_trapi(query_graphs.README_NODES, query_graphs.README_EDGES)
+
 def test_one_hop():
     trapi = construct_trapi( {'n0':True, 'n1':False}, {'e0':('n0','n1')})
     plans = generate_plan(trapi)
@@ -129,21 +134,17 @@ def test_double_loop():
 
 def test_readme():
     """Planning the query shown in README.md"""
-    trapi = construct_trapi({'A': True, 'B': True, 'C': False, 'D': False, 'E':False, 'F': False,
-                             'G': False, 'H': False, 'I':True},
-                            {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'AC': ('A', 'C'), 'CD': ('C', 'D'),
-                             'DE': ('D','E'), 'DF': ('D','F'), 'EF': ('E','F'), 'FG': ('F', 'G'),
-                             'GH': ('G','H'), 'GI':('G','I')})
-    plans = generate_plan(trapi)
+    plans = generate_plan(readme_trapi())
     assert len(plans) == 2
     plan = plans[0]
     assert plan.start() == ['AB']
     planb = plans[1]
-    assert set(planb.start()) == set(['AC','BC'])
+    #GI starts from the bound node I, so it doesn't wait for ABC
+    assert set(planb.start()) == set(['AC','BC','GI'])
     join1 = ( frozenset(['A','B','C']), frozenset(['AC','BC']))
     assert planb.get_next('AC') == planb.get_next('BC') == [join1]
     assert set(planb.get_prev(join1)) == set( [ 'AC', 'BC'])
-    assert set(planb.get_next(join1)) == set(['CD','GI'])
+    assert planb.get_next(join1) == ['CD']
     assert planb.get_next('CD') == ['DF']
     assert planb.get_next('GI') == ['FG']
     join2 = ( frozenset(['A','B','C','D','F','G','I']), frozenset(['AC','BC','CD','DF','FG','GI']))
@@ -154,3 +155,144 @@ def test_readme():
     assert planb.get_next(join3) == ['GH']
     assert isinstance(planb.get_next('GH')[0], TerminalEvent)
 
+
+def test_parallel_hair():
+    """A one-hop with two predicates, then another hop.  Both parallel edges have to finish before moving on"""
+    trapi = construct_trapi({'n0': True, 'n1': False, 'n2': False},
+                            {'e0': ('n0', 'n1'), 'e1': ('n1', 'n0'), 'e2': ('n1', 'n2')})
+    plans = generate_plan(trapi)
+    assert len(plans) == 1
+    plan = plans[0]
+    assert plan.start() == ['e0','e1']
+    join = (frozenset(['n0','n1']), frozenset(['e0','e1']))
+    assert plan.get_next('e0') == plan.get_next('e1') == [join]
+    assert plan.get_next(join) == ['e2']
+    assert isinstance(plan.get_next('e2')[0], TerminalEvent)
+
+def test_parallel_double_pin():
+    trapi = construct_trapi({'n0': True, 'n1': True}, {'e0': ('n0', 'n1'), 'e1': ('n0', 'n1')})
+    plans = generate_plan(trapi)
+    assert len(plans) == 1
+    plan = plans[0]
+    assert plan.start() == ['e0','e1']
+    join = (frozenset(['n0','n1']), frozenset(['e0','e1']))
+    assert plan.get_next('e0') == plan.get_next('e1') == [join]
+    assert isinstance(plan.get_next(join)[0], TerminalEvent)
+
+def test_parallel_path():
+    """A-B-C with A and C bound, and two edges between B and C"""
+    trapi = construct_trapi({'A': True, 'B': False, 'C': True},
+                            {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'CB': ('C', 'B')})
+    plans = generate_plan(trapi)
+    assert len(plans) == 1
+    plan = plans[0]
+    assert plan.start() == ['AB','BC','CB']
+    bundle = (frozenset(['B','C']), frozenset(['BC','CB']))
+    assert plan.get_next('BC') == plan.get_next('CB') == [bundle]
+    join = (frozenset(['A','B','C']), frozenset(['AB','BC','CB']))
+    assert plan.get_next('AB') == plan.get_next(bundle) == [join]
+
+def test_parallel_core():
+    """Parallel edges in the middle of the graph still only count once each: nothing else gets left out"""
+    trapi = construct_trapi({'A': True, 'B': False, 'C': True, 'D': False},
+                            {'AB1': ('A', 'B'), 'AB2': ('A', 'B'), 'AB3': ('A', 'B'), 'BC1': ('B', 'C'),
+                             'BC2': ('B', 'C'), 'AD': ('A', 'D'), 'DC': ('D', 'C'), 'BD': ('B', 'D')})
+    plans = generate_plan(trapi)
+    planned = set( x for plan in plans for x in list(plan.nexts) + list(plan.prevs) if isinstance(x, str) )
+    assert planned == set(trapi['edges'])
+
+def plan_layout(plan):
+    """Everything about a plan, in order, with terminal events numbered by first appearance"""
+    terminals = {}
+    def name(x):
+        if isinstance(x, TerminalEvent):
+            return ('terminal', x.name, terminals.setdefault(x, len(terminals)))
+        return x
+    return ([ (name(x), [name(n) for n in nexts]) for x, nexts in plan.nexts.items() ],
+            [ (name(x), [name(p) for p in prevs]) for x, prevs in plan.prevs.items() ])
+
+def runnable_edges(plan):
+    """The edges that a run of the plan gets to: each event runs once everything before it has run"""
+    root = (frozenset(), frozenset())
+    done = set([root])
+    waiting = { x: len(prevs) for x, prevs in plan.prevs.items() }
+    ready = [root]
+    while ready:
+        x = ready.pop()
+        for y in plan.nexts.get(x, []):
+            waiting[y] -= 1
+            if waiting[y] == 0 and y not in done:
+                done.add(y)
+                ready.append(y)
+    return set( x for x in done if isinstance(x, str) )
+
+def test_trivial_shapes(monkeypatch):
+    """The shortcuts for one-hops, chains and stars make the same plans as the general planner"""
+    import src.generate_plan
+    shapes = [ ({'n0': True, 'n1': False}, {'e0': ('n0', 'n1')}),
+               ({'n0': False, 'n1': True}, {'e0': ('n0', 'n1'), 'e1': ('n1', 'n0')}),
+               ({'n0': True, 'n1': True}, {'e0': ('n1', 'n0')}),
+               ({'n0': False, 'n1': False, 'n2': True}, {'e0': ('n0', 'n1'), 'e1': ('n2', 'n1')}),
+               ({'n0': True, 'n1': False, 'n2': True}, {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2')}),
+               ({'n0': False, 'n1': True, 'n2': False, 'n3': False}, {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n3', 'n1')}),
+               ({'n3': True, 'n1': False, 'n2': False, 'n0': True, 'n4': False},
+                {'e0': ('n3', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n2', 'n4'), 'e3': ('n4', 'n0'), 'e4': ('n4', 'n0')}) ]
+    from bench import query_graphs
+    trapis = [ construct_trapi(nodes, edges) for nodes, edges in shapes ]
+    trapis += [ query_graphs.chain(n, bound) for n in (1, 2, 5) for bound in (1, 2) ] + [ query_graphs.star(5) ]
+    for trapi in trapis:
+        fast = generate_plan(trapi)
+        with monkeypatch.context() as m:
+            m.setattr(src.generate_plan, 'trivial_plan', lambda *args: None)
+            slow = generate_plan(trapi)
+        assert [plan_layout(p) for p in fast] == [plan_layout(p) for p in slow]
+
+def test_trivial_shapes_skip_planning():
+    from src.plan_stats import PlanStats
+    stats = PlanStats()
+    plans = generate_plan(construct_trapi({'n0': True, 'n1': False, 'n2': False}, {'e0': ('n0', 'n1'), 'e1': ('n0', 'n2')}), stats=stats)
+    assert len(plans) == 2
+    assert 'decompose' not in stats.seconds
+    #A branch isn't a chain or a star
+    stats = PlanStats()
+    generate_plan(construct_trapi({'n0': True, 'n1': False, 'n2': False, 'n3': False},
+                                  {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n1','n3')}), stats=stats)
+    assert 'decompose' in stats.seconds
+
+def test_components_in_parallel():
+    from bench import query_graphs
+    trapi = query_graphs.readme(3)
+    assert [plan_layout(p) for p in generate_plan(trapi, workers=2, component_timeout=60)] == \
+           [plan_layout(p) for p in generate_plan(trapi)]
+
+def test_independent_loops():
+    """Two loops off of different bound nodes, A and D, connected by C-G-E.  The loops don't need each other's
+    joins, so they run side by side, and the path between them waits for both"""
+    trapi = construct_trapi({'A': True, 'B': False, 'C': False, 'D': True, 'E': False, 'F': False, 'G': False},
+                            {'AB': ('A', 'B'), 'BC': ('B', 'C'), 'CA': ('C', 'A'), 'CG': ('C', 'G'),
+                             'GE': ('G', 'E'), 'DE': ('D', 'E'), 'EF': ('E', 'F'), 'FD': ('F', 'D')})
+    plan = generate_plan(trapi)[0]
+    assert set(plan.start()) == set(['AB', 'CA', 'DE', 'FD'])
+    abc = (frozenset(['A', 'B', 'C']), frozenset(['AB', 'BC', 'CA']))
+    def_ = (frozenset(['D', 'E', 'F']), frozenset(['DE', 'EF', 'FD']))
+    assert plan.get_next('CG') == plan.get_next('GE') == [plan.end()[0]]
+    assert plan.get_prev('CG') == [abc]
+    assert plan.get_prev('GE') == [def_]
+    assert plan.depth() == 3
+    assert plan.width() == 4
+
+def test_depth_and_width():
+    from bench import query_graphs
+    #n0*-n1-n2-n3, with a hair n1-n4
+    trapi = construct_trapi({'n0': True, 'n1': False, 'n2': False, 'n3': False, 'n4': False},
+                            {'e0': ('n0', 'n1'), 'e1': ('n1', 'n2'), 'e2': ('n2', 'n3'), 'e3': ('n1', 'n4')})
+    plan = generate_plan(trapi)[0]
+    assert plan.depth() == 3
+    assert plan.width() == 2
+    assert plan.critical_path() == ['e0', 'e1', 'e2']
+    slow = {'e3': 10}
+    assert plan.depth(cost=lambda edge: slow.get(edge, 1)) == 11
+    assert plan.critical_path(cost=lambda edge: slow.get(edge, 1)) == ['e0', 'e3']
+    readme = generate_plan(query_graphs.readme(1))[-1]
+    path = readme.critical_path()
+    assert len([ x for x in path if isinstance(x, str) ]) == readme.depth() == 5
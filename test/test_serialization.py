@@ -0,0 +1,90 @@
+import json
+import pickle
+
+import pytest
+
+from bench import query_graphs
+from src.generate_plan import generate_plan
+from src.QueryPlan import QueryPlan, TerminalEvent
+from test_plans import plan_layout
+
+def plans():
+    return generate_plan(query_graphs.readme(2)) + generate_plan(query_graphs.hairy_tree(10, 3)) + \
+           generate_plan(query_graphs.grid(3, 2))
+
+def test_bytes_round_trip():
+    for plan in plans():
+        loaded = QueryPlan.from_bytes(plan.to_bytes())
+        assert plan_layout(loaded) == plan_layout(plan)
+        assert loaded.inputs() == plan.inputs()
+
+def test_json_round_trip():
+    for plan in plans():
+        text = plan.to_json()
+        loaded = QueryPlan.from_json(text)
+        assert plan_layout(loaded) == plan_layout(plan)
+        assert loaded.to_json() == text
+        assert loaded.inputs() == plan.inputs()
+
+def test_terminals_shared():
+    """The hairs of a tree all end at the same terminal event, and still do after loading"""
+    plan = generate_plan(query_graphs.hairy_tree(6))[0]
+    loaded = QueryPlan.from_bytes(plan.to_bytes())
+    terminals = [ x for x in loaded.prevs if isinstance(x, TerminalEvent) ]
+    assert len(terminals) == 1
+    assert terminals[0].name == 'Hair'
+
+def test_json_form():
+    plan = generate_plan(query_graphs.chain(2, 2))[0]
+    data = json.loads(plan.to_json())
+    assert data['version'] == 3
+    assert data['events'][0] == [[], []]
+    assert data['strings'][data['events'][1]] == 'e0'
+    assert data['nexts'][0] == [0, [1, 2]]
+    assert data['directions'] == [[0, 2, 3], [1, 4, 3]]
+
+def test_smaller_than_pickle():
+    plan = generate_plan(query_graphs.readme(5))[-1]
+    assert len(plan.to_bytes()) < len(pickle.dumps(plan)) / 2
+
+def test_bad_input():
+    data = plans()[0].to_bytes()
+    with pytest.raises(ValueError):
+        QueryPlan.from_bytes(b'nope' + data[4:])
+    with pytest.raises(ValueError):
+        QueryPlan.from_bytes(data[:4] + b'\x09' + data[5:])
+    with pytest.raises(ValueError):
+        QueryPlan.from_dict(dict(json.loads(plans()[0].to_json()), version=0))
+
+@pytest.mark.parametrize('short', [3, 10, 40])
+def test_truncated(short):
+    data = plans()[0].to_bytes()
+    with pytest.raises(ValueError, match='Truncated QueryPlan'):
+        QueryPlan.from_bytes(data[:-short])
+
+def test_truncated_header():
+    data = plans()[0].to_bytes()
+    with pytest.raises(ValueError, match='Truncated QueryPlan'):
+        QueryPlan.from_bytes(data[:6])
+
+def test_version_1():
+    """Plans saved before joins had parents can still be loaded"""
+    v1 = {'version': 1, 'strings': ['A', 'B', 'AB', 'BC', 'C', 'done'],
+          'events': [[[], []], 2, 3, [[0, 1, 4], [2, 3]], {'terminal': 5}],
+          'nexts': [[0, [1, 2]], [1, [3]], [2, [3]], [3, [4]]], 'prevs': [[1, [0]], [2, [0]], [3, [1, 2]], [4, [3]]]}
+    plan = QueryPlan.from_dict(v1)
+    join = (frozenset(['A', 'B', 'C']), frozenset(['AB', 'BC']))
+    assert plan.start() == ['AB', 'BC']
+    assert plan.get_next('AB') == [join]
+    assert plan.get_next(join)[0].name == 'done'
+
+def test_version_2():
+    """Plans saved before edges had directions load without them"""
+    plan = generate_plan(query_graphs.chain(2, 2))[0]
+    data = plan.to_dict()
+    del data['directions']
+    data['version'] = 2
+    loaded = QueryPlan.from_dict(data)
+    assert plan_layout(loaded) == plan_layout(plan)
+    assert loaded.get_input('e0') is None
+    assert loaded.compile().get_input('e0') is None
@@ -1,8 +1,13 @@
+import time
+
 import networkx as nx
 from collections import defaultdict
+from bench import query_graphs
 from src.QueryPlan import QueryPlan
+from src.plan_stats import PlanStats
+from test_plans import construct_trapi, runnable_edges
 
-from src.generate_plan import generate_simple_plan, get_paths, get_cycles, process_path
+from src.generate_plan import generate_plan, generate_simple_plan, get_paths, get_cycles, process_path, candidate_paths, add_bfs
 
 def test_paths():
     """One path going n0*-n1-n2-n3*.  Also n1-n4-n2."""
@@ -118,4 +123,117 @@ def test_plan():
     assert plan.get_next('x1') == [join2]
     assert plan.get_next('x2') == [join2]
     assert plan.get_next(join2) == []
-    assert plan.end() == [join2]
\ No newline at end of file
+    assert plan.end() == [join2]
+def build_crossbar():
+    """One path going n0*-n1-n2-n3*.  Also n1-n4-n2."""
+    g = nx.Graph()
+    g.add_node('n0',bound=True)
+    g.add_node('n1',bound=False)
+    g.add_edge('n0','n1',edge_id='e1')
+    g.add_node('n2',bound=False)
+    g.add_edge('n1','n2',edge_id='e2')
+    g.add_node('n3',bound=True)
+    g.add_edge('n2','n3',edge_id='e3')
+    g.add_node('n4',bound=False)
+    g.add_edge('n1','n4',edge_id='x1')
+    g.add_edge('n2','n4',edge_id='x2')
+    return g
+
+def test_candidate_order():
+    """Paths come out shortest first"""
+    g = build_crossbar()
+    paths = list(candidate_paths(g))
+    assert paths == [['n0','n1','n2','n3'], ['n0','n1','n4','n2','n3']]
+    assert list(candidate_paths(g,max_length=3)) == [['n0','n1','n2','n3']]
+
+def test_path_budget():
+    """If we run out of paths, the rest of the graph is walked breadth first, so no edge is left out"""
+    g = build_crossbar()
+    every_edge = set(['e1','e2','e3','x1','x2'])
+    for budget in ({'max_paths': 1}, {'max_path_length': 3}):
+        stats = PlanStats()
+        plan,traversed = generate_simple_plan(g, stats=stats, **budget)
+        assert traversed['edges'] == every_edge
+        assert set(plan.start()) >= set(['e1','e3'])
+        planned = set( x for x in list(plan.prevs) + list(plan.nexts) if isinstance(x, str) )
+        assert planned == every_edge
+        assert stats.counts['budget_fallbacks'] == 1
+    stats = PlanStats()
+    plan,traversed = generate_simple_plan(g, max_paths=2, stats=stats)
+    assert traversed['edges'] == every_edge
+    assert 'budget_fallbacks' not in stats.counts
+
+def test_budget_chords():
+    """When the paths have reached every node and only chords are left, they still get run"""
+    trapi = construct_trapi({'n0': False, 'n1': False, 'n2': True, 'n3': True},
+                            {'e0': ('n1', 'n0'), 'e1': ('n2', 'n1'), 'e2': ('n3', 'n1'), 'e3': ('n0', 'n3'),
+                             'e4': ('n0', 'n2')})
+    plans = generate_plan(trapi, max_paths=2)
+    assert set().union(*map(runnable_edges, plans)) == set(trapi['edges'])
+
+def build_clique(n, bound):
+    g = nx.Graph()
+    for i in range(n):
+        g.add_node(f'n{i}', bound=i in bound)
+    for i in range(n):
+        for j in range(i+1,n):
+            g.add_edge(f'n{i}', f'n{j}', edge_id=f'e{i}_{j}')
+    return g
+
+def test_cycles_once():
+    """In a K4 with two bound nodes, each of the 7 cycles shows up once, shortest first"""
+    g = build_clique(4, [0,2])
+    cycles = get_cycles(g)
+    assert len(cycles) == 7
+    assert [len(c) for c in cycles] == [4,4,4,4,5,5,5]
+    assert len(set(frozenset(zip(c,c[1:])) for c in cycles)) == 7
+    for cycle in cycles:
+        assert cycle[0] == cycle[-1]
+        assert cycle[0] == 'n0' or (cycle[0] == 'n2' and 'n0' not in cycle)
+
+def test_clique():
+    """A clique has too many cycles to list, but we only need a few of them to cover it"""
+    g = build_clique(10, [0])
+    plan,traversed = generate_simple_plan(g)
+    assert len(traversed['edges']) == g.number_of_edges()
+    assert len(plan.start()) == 2
+
+def test_paths_found():
+    """Paths are taken as they are found, so a grid with lots of paths of each length doesn't list them all"""
+    trapi = query_graphs.grid(5, 4)
+    stats = PlanStats()
+    generate_plan(trapi, stats=stats)
+    assert stats.counts['paths_found'] + stats.counts['cycles_found'] < 5 * len(trapi['edges'])
+
+def test_deadline():
+    """Out of time before any paths: walk the whole thing breadth first"""
+    g = build_crossbar()
+    plan,traversed = generate_simple_plan(g, deadline=time.monotonic() - 1)
+    assert traversed['edges'] == set(['e1','e2','e3','x1','x2'])
+    assert plan.start() == ['e1','e3']
+    assert plan.get_next('e1') == ['x1']
+    tree = (frozenset(['n0','n1','n2','n3','n4']), frozenset(['e1','e3','x1']))
+    assert plan.get_next('e3') == plan.get_next('x1') == [tree]
+    assert plan.get_next(tree) == ['e2','x2']
+    assert plan.end() == [(frozenset(['n0','n1','n2','n3','n4']), frozenset(['e1','e2','e3','x1','x2']))]
+
+def test_add_bfs():
+    """The BFS picks up from the join at the end of the paths so far"""
+    g = build_crossbar()
+    plan = QueryPlan()
+    traversed = { 'nodes': set(), 'edges': set() }
+    process_path(g, ['n0','n1','n2','n3'], plan, traversed)
+    add_bfs(g, plan, traversed)
+    join = (frozenset(['n0','n1','n2','n3']), frozenset(['e1','e2','e3']))
+    assert plan.get_next(join) == ['x1']
+    tree = (frozenset(['n0','n1','n2','n3','n4']), frozenset(['e1','e2','e3','x1']))
+    assert plan.get_next('x1') == [tree]
+    assert plan.get_next(tree) == ['x2']
+    assert len(traversed['edges']) == 5
+
+def test_clique_deadline():
+    g = build_clique(10, [0, 5])
+    plan,traversed = generate_simple_plan(g, deadline=time.monotonic())
+    assert len(traversed['edges']) == g.number_of_edges()
+    edges = set(x for x in list(plan.nexts) + list(plan.prevs) if isinstance(x, str))
+    assert len(edges) == g.number_of_edges()